@@ -0,0 +1,16 @@
+#!/usr/bin/env sh
+
+until nc -zw3 mysql 3306; do
+  >&2 echo "MySQL is unavailable - sleeping"
+  sleep 1
+done
+
+echo "All services up"
+
+mkdir -p bench
+
+if [ -f bench/baseline.json ]; then
+  bin/bench.py --compare bench/baseline.json "$@"
+else
+  bin/bench.py --save bench/baseline.json "$@"
+fi
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+
+import os
+
+import uvicorn
+
+import asgi
+import service
+
+# One process on an event loop, see lib/asgi.py, for when connections far
+# outnumber the threads gunicorn could afford
+
+uvicorn.run(
+    asgi.App(service.app().app),
+    host="0.0.0.0",
+    port=int(os.environ.get("API_PORT", 7865)),
+    loop="asyncio",
+    lifespan="on"
+)
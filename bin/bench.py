@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import threading
+import http.client
+import urllib.parse
+import unittest.mock
+
+import yaml
+import jsonschema
+import connexion.decorators.validation
+
+import nandy.store.graphite
+import nandy.store.redis
+import nandy.store.mysql
+
+import metrics
+import service
+
+# Seeds a synthetic household and drives every operation in the spec, in
+# process through the Flask test client and optionally over real HTTP against
+# a running server, reporting req/s, latency percentiles and memory
+
+SPEC = "/opt/pi-k8s/openapi/service.yaml"
+
+def arguments():
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--persons", type=int, default=10)
+    parser.add_argument("--areas", type=int, default=20)
+    parser.add_argument("--templates", type=int, default=100)
+    parser.add_argument("--chores", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, nargs=2, default=[10, 100])
+    parser.add_argument("--acts", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=50, help="requests per operation in process")
+    parser.add_argument("--url", help="also load a running server, e.g. http://localhost:7865")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10, help="seconds of HTTP load per operation")
+    parser.add_argument("--save", help="write the results here as a baseline")
+    parser.add_argument("--compare", help="compare against this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing")
+    parser.add_argument("--seed", type=int, default=7)
+
+    return parser.parse_args()
+
+def seed(session, options):
+
+    random.seed(options.seed)
+
+    now = int(time.time())
+
+    session.bulk_insert_mappings(nandy.store.mysql.Person, [
+        {"name": f"person-{index}", "email": f"person-{index}@example.com"}
+        for index in range(options.persons)
+    ])
+
+    session.bulk_insert_mappings(nandy.store.mysql.Area, [
+        {"name": f"area-{index}", "status": "clean", "updated": now, "data": {"statuses": [{"value": "clean"}]}}
+        for index in range(options.areas)
+    ])
+
+    session.bulk_insert_mappings(nandy.store.mysql.Template, [
+        {"name": f"template-{index}", "kind": "chore", "data": {"text": f"template {index}", "tasks": [{"text": "do it"}]}}
+        for index in range(options.templates)
+    ])
+
+    session.commit()
+
+    persons = [person_id for (person_id,) in session.query(nandy.store.mysql.Person.person_id)]
+
+    session.bulk_insert_mappings(nandy.store.mysql.Chore, [
+        {
+            "person_id": random.choice(persons),
+            "name": f"chore-{index}",
+            "status": random.choice(["started", "ended"]),
+            "created": now - index,
+            "updated": now - index,
+            "data": {
+                "text": f"chore {index}",
+                "language": "en-us",
+                "node": random.choice(["pi-k8s-timmy", "pi-k8s-sally"]),
+                "start": now - index,
+                "tasks": [
+                    {"id": task, "text": f"task {task}", "start": now - index}
+                    for task in range(random.randint(*options.tasks))
+                ]
+            }
+        }
+        for index in range(options.chores)
+    ])
+
+    session.commit()
+
+    for start in range(0, options.acts, 5000):
+
+        session.bulk_insert_mappings(nandy.store.mysql.Act, [
+            {
+                "person_id": random.choice(persons),
+                "name": f"act-{index}",
+                "value": random.choice(["positive", "negative"]),
+                "created": now - index,
+                "data": {"text": f"act {index}"}
+            }
+            for index in range(start, min(start + 5000, options.acts))
+        ])
+
+        session.commit()
+
+def first(session, model):
+
+    primary = model.__mapper__.primary_key[0]
+
+    return session.query(primary).order_by(primary).first()[0]
+
+def operations(session):
+
+    # One request per operationId, writes act on their own throwaway rows
+    # where they'd otherwise destroy the dataset
+
+    person_id = first(session, nandy.store.mysql.Person)
+    area_id = first(session, nandy.store.mysql.Area)
+    template_id = first(session, nandy.store.mysql.Template)
+    chore_id = first(session, nandy.store.mysql.Chore)
+    act_id = first(session, nandy.store.mysql.Act)
+
+    return {
+        "service.health": ("GET", "/health", None),
+        "service.health_live": ("GET", "/health/live", None),
+        "service.health_ready": ("GET", "/health/ready", None),
+        "service.cache_list": ("GET", "/cache", None),
+        "service.event_stream": ("GET", "/event?timeout=0", None),
+        "service.setting_list": ("GET", "/setting", None),
+        "service.person_list": ("GET", "/person", None),
+        "service.person_create": ("POST", "/person", {"person": {"name": "bench", "email": "bench"}}),
+        "service.person_bulk_create": ("POST", "/person/bulk", {"persons": [{"name": "bench"}] * 10}),
+        "service.person_bulk_update": ("PATCH", "/person/bulk", {"persons": [{"person_id": person_id, "email": "bench"}]}),
+        "service.person_bulk_delete": ("DELETE", "/person/bulk?person_ids=0", None),
+        "service.person_retrieve": ("GET", f"/person/{person_id}", None),
+        "service.person_update": ("PATCH", f"/person/{person_id}", {"person": {"email": "bench"}}),
+        "service.person_delete": ("DELETE", "/person/0", None),
+        "service.area_list": ("GET", "/area", None),
+        "service.area_create": ("POST", "/area", {"area": {"name": "bench", "status": "clean", "data": {}}}),
+        "service.area_retrieve": ("GET", f"/area/{area_id}", None),
+        "service.area_update": ("PATCH", f"/area/{area_id}", {"area": {"status": "clean"}}),
+        "service.area_status": ("POST", f"/area/{area_id}/clean", None),
+        "service.area_delete": ("DELETE", "/area/0", None),
+        "service.template_list": ("GET", "/template", None),
+        "service.template_create": ("POST", "/template", {"template": {"name": "bench", "kind": "chore", "data": {}}}),
+        "service.template_bulk_create": ("POST", "/template/bulk", {"templates": [{"name": "bench", "kind": "chore", "data": {}}] * 10}),
+        "service.template_bulk_update": ("PATCH", "/template/bulk", {"templates": [{"template_id": template_id, "kind": "chore"}]}),
+        "service.template_bulk_delete": ("DELETE", "/template/bulk?template_ids=0", None),
+        "service.template_retrieve": ("GET", f"/template/{template_id}", None),
+        "service.template_update": ("PATCH", f"/template/{template_id}", {"template": {"kind": "chore"}}),
+        "service.template_delete": ("DELETE", "/template/0", None),
+        "service.chore_list": ("GET", "/chore", None),
+        "service.chore_create": ("POST", "/chore", {"template": {
+            "person": "person-0", "name": "bench", "node": "pi-k8s-timmy", "text": "bench", "tasks": [{"text": "do it"}]
+        }}),
+        "service.chore_bulk_update": ("PATCH", "/chore/bulk", {"chores": [{"chore_id": chore_id, "status": "started"}]}),
+        "service.chore_bulk_delete": ("DELETE", "/chore/bulk?chore_ids=0", None),
+        "service.chore_retrieve": ("GET", f"/chore/{chore_id}", None),
+        "service.chore_update": ("PATCH", f"/chore/{chore_id}", {"chore": {"status": "started"}}),
+        "service.chore_action": ("POST", f"/chore/{chore_id}/pause", None),
+        "service.chore_delete": ("DELETE", "/chore/0", None),
+        "service.chore_actions": ("POST", f"/chore/{chore_id}/actions", {"actions": [
+            {"action": "pause", "task_id": 0}, {"action": "unpause", "task_id": 0}
+        ]}),
+        "service.task_action": ("POST", f"/chore/{chore_id}/task/0/pause", None),
+        "service.act_list": ("GET", "/act", None),
+        "service.act_create": ("POST", "/act", {"act": {"person_id": person_id, "name": "bench", "value": "positive", "data": {}}}),
+        "service.act_bulk_update": ("PATCH", "/act/bulk", {"acts": [{"act_id": act_id, "value": "positive"}]}),
+        "service.act_bulk_delete": ("DELETE", "/act/bulk?act_ids=0", None),
+        "service.act_retrieve": ("GET", f"/act/{act_id}", None),
+        "service.act_update": ("PATCH", f"/act/{act_id}", {"act": {"value": "positive"}}),
+        "service.act_delete": ("DELETE", "/act/0", None)
+    }
+
+def spec():
+
+    with open(SPEC, "r") as spec_file:
+        return yaml.load(spec_file, Loader=service.YAML_LOADER)
+
+def specified():
+
+    return sorted(
+        operation["operationId"]
+        for path in spec()["paths"].values()
+        for method, operation in path.items()
+        if isinstance(operation, dict) and "operationId" in operation
+    )
+
+def bodies():
+
+    loaded = spec()
+
+    return {
+        operation["operationId"]: (parameter["schema"], loaded)
+        for path in loaded["paths"].values()
+        for method, operation in path.items()
+        if isinstance(operation, dict) and "operationId" in operation
+        for parameter in operation.get("parameters", [])
+        if parameter.get("in") == "body"
+    }
+
+def summarize(latencies, elapsed, rss=None):
+
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50": round(metrics.percentile(latencies, 50) * 1000, 3),
+        "p95": round(metrics.percentile(latencies, 95) * 1000, 3),
+        "p99": round(metrics.percentile(latencies, 99) * 1000, 3),
+        "peak_rss_kb": rss[0] if rss else None,
+        "rss_growth_kb": rss[1] if rss else None
+    }
+
+def peak():
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def client(api, requests, count):
+
+    # ru_maxrss is the whole process' high water mark and never goes down, so
+    # an operation is only charged with how far it pushed that mark, and the
+    # mark itself is reported as what it is, the process peak so far
+
+    results = {}
+
+    for operation, (method, path, body) in sorted(requests.items()):
+
+        latencies = []
+        before = peak()
+        start = time.time()
+
+        for _ in range(count):
+
+            began = time.time()
+            api.open(path, method=method, json=body)
+            latencies.append(time.time() - began)
+
+        elapsed = time.time() - start
+        after = peak()
+
+        results[operation] = summarize(latencies, elapsed, (after, after - before))
+
+    return results
+
+def validate(requests, count):
+
+    # Validation on its own, with the same validator class connexion builds
+    # once per operation, so its share of each write's latency is visible
+
+    results = {}
+    schemas = bodies()
+
+    for operation, (method, path, body) in sorted(requests.items()):
+
+        if body is None or operation not in schemas:
+            continue
+
+        schema, loaded = schemas[operation]
+
+        validator = connexion.decorators.validation.Draft4RequestValidator(
+            schema, resolver=jsonschema.RefResolver("", loaded)
+        )
+
+        latencies = []
+        start = time.time()
+
+        for _ in range(count):
+
+            began = time.time()
+            validator.validate(body)
+            latencies.append(time.time() - began)
+
+        results[operation] = summarize(latencies, time.time() - start)
+
+    return results
+
+def load(url, requests, concurrency, duration):
+
+    # Keep-alive connections from a pool of threads hammering one operation at
+    # a time, read only so the dataset is the same for every operation
+
+    parsed = urllib.parse.urlparse(url)
+    results = {}
+
+    for operation, (method, path, body) in sorted(requests.items()):
+
+        if method != "GET" or operation == "service.event_stream":
+            continue
+
+        latencies = []
+        lock = threading.Lock()
+        deadline = time.time() + duration
+
+        def worker():
+
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80)
+            local = []
+
+            while time.time() < deadline:
+
+                began = time.time()
+                connection.request(method, path, headers={"Connection": "keep-alive"})
+                connection.getresponse().read()
+                local.append(time.time() - began)
+
+            connection.close()
+
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.time()
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        results[operation] = summarize(latencies, time.time() - start)
+
+    return results
+
+def compare(results, baseline, tolerance):
+
+    regressions = []
+
+    for mode, operations in baseline.items():
+        for operation, before in operations.items():
+
+            after = results.get(mode, {}).get(operation)
+
+            if after is None or not before["rps"]:
+                continue
+
+            change = after["rps"] / before["rps"] - 1
+
+            print(f"{mode:8} {operation:32} {before['rps']:>10} -> {after['rps']:>10} req/s ({change:+.1%})")
+
+            if change < -tolerance:
+                regressions.append(f"{mode} {operation}")
+
+    return regressions
+
+@unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+@unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+def main():
+
+    options = arguments()
+
+    app = service.app()
+    session = app.app.data.mysql.session
+
+    nandy.store.mysql.create_database()
+    nandy.store.mysql.Base.metadata.create_all(app.app.data.mysql.engine)
+
+    seed(session, options)
+
+    requests = operations(session)
+
+    missing = sorted(set(specified()) - set(requests.keys()))
+
+    if missing:
+        print(f"operations without a benchmark: {missing}", file=sys.stderr)
+
+    results = {
+        "client": client(app.app.test_client(), requests, options.requests),
+        "validate": validate(requests, options.requests * 10)
+    }
+
+    if options.url:
+        results["http"] = load(options.url, requests, options.concurrency, options.duration)
+
+    for mode, operations_results in results.items():
+        for operation, result in operations_results.items():
+            print(f"{mode:8} {operation:32} {json.dumps(result)}")
+
+    if options.save:
+        with open(options.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if options.compare:
+
+        with open(options.compare, "r") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), options.tolerance)
+
+        if regressions:
+            print(f"regressions: {regressions}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+import sqlalchemy
+import sqlalchemy.exc
+
+import nandy.data
+import nandy.store.mysql
+
+# Indexes backing the chore and act list filters, only created if missing so
+# this is safe to run on every start
+
+INDEXES = [
+    sqlalchemy.Index("chore_status_updated", nandy.store.mysql.Chore.status, nandy.store.mysql.Chore.updated),
+    sqlalchemy.Index("chore_person_status", nandy.store.mysql.Chore.person_id, nandy.store.mysql.Chore.status),
+    sqlalchemy.Index("chore_created", nandy.store.mysql.Chore.created),
+    sqlalchemy.Index("act_person_created", nandy.store.mysql.Act.person_id, nandy.store.mysql.Act.created),
+    sqlalchemy.Index("act_created", nandy.store.mysql.Act.created)
+]
+
+engine = nandy.data.NandyData().mysql.engine
+
+def exists(index):
+
+    return index.name in [existing["name"] for existing in sqlalchemy.inspect(engine).get_indexes(index.table.name)]
+
+for index in INDEXES:
+
+    if exists(index):
+        continue
+
+    print(f"creating {index.name}")
+
+    # Replicas starting together can race to create the same index, losing
+    # that race is fine
+
+    try:
+        index.create(engine)
+    except sqlalchemy.exc.DBAPIError:
+        if not exists(index):
+            raise
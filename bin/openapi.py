@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+import spec
+
+# Build step, pre-parses openapi/service.yaml into service.json for service.app()
+
+directory = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("SPEC_DIR", "/opt/pi-k8s/openapi")
+
+print(f"compiled {spec.compile(directory)}")
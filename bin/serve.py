@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+import os
+import multiprocessing
+
+import gunicorn.app.base
+
+import service
+
+class Serve(gunicorn.app.base.BaseApplication):
+
+    def __init__(self, options):
+
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+
+        # Without preload this runs in each worker after the fork, so every
+        # worker builds its own NandyData and MySQL/Redis connections
+
+        return service.app().app
+
+Serve({
+    "bind": f"0.0.0.0:{os.environ.get('API_PORT', 7865)}",
+    "workers": int(os.environ.get("API_WORKERS", multiprocessing.cpu_count())),
+    "threads": int(os.environ.get("API_THREADS", 1)),
+    "worker_class": os.environ.get("API_WORKER_CLASS", "gthread"),
+    "keepalive": int(os.environ.get("API_KEEPALIVE", 5)),
+    "timeout": int(os.environ.get("API_TIMEOUT", 30)),
+    "graceful_timeout": int(os.environ.get("API_GRACEFUL_TIMEOUT", 30)),
+    "max_requests": int(os.environ.get("API_MAX_REQUESTS", 0)),
+    "max_requests_jitter": int(os.environ.get("API_MAX_REQUESTS_JITTER", 0)),
+    "preload_app": False,
+    "accesslog": "-"
+}).run()
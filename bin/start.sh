@@ -0,0 +1,8 @@
+#!/usr/bin/env sh
+
+# Make sure the list indexes exist before serving, safe on every start
+
+set -e
+
+/opt/pi-k8s/bin/index.py
+exec /opt/pi-k8s/bin/serve.py
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import argparse
+import unittest.mock
+
+# Measures how long a worker takes to become ready to serve, split into the
+# imports, loading the spec and building the app, against a target in seconds
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--target", type=float, default=float(os.environ.get("STARTUP_TARGET", 3.0)))
+parser.add_argument("--mock", action="store_true", help="mock Redis and Graphite like the tests do")
+options = parser.parse_args()
+
+timings = {}
+
+start = time.time()
+import service
+timings["import"] = time.time() - start
+
+start = time.time()
+service.spec.load(service.SPEC_DIR)
+timings["spec"] = time.time() - start
+
+patches = []
+
+if options.mock:
+    import nandy.store.graphite
+    import nandy.store.redis
+    patches = [
+        unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender),
+        unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    ]
+
+for patch in patches:
+    patch.start()
+
+start = time.time()
+service.app()
+timings["app"] = time.time() - start
+
+for patch in patches:
+    patch.stop()
+
+timings["total"] = timings["import"] + timings["app"]
+timings["target"] = options.target
+
+print(json.dumps({name: round(seconds, 3) for name, seconds in timings.items()}))
+
+sys.exit(0 if timings["total"] <= options.target else 1)
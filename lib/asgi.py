@@ -0,0 +1,340 @@
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import urllib.parse
+import concurrent.futures
+
+import werkzeug.http
+import werkzeug.datastructures
+
+import service
+
+# Serves the same app over ASGI. Almost every operation is still the sync
+# service.* handler, run whole on a bounded pool of threads, but /event, the
+# one that holds connections open, is handled natively on the event loop so
+# hundreds of waiting displays cost a queue each rather than a thread each
+
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", 4))
+ASGI_CHUNKS = int(os.environ.get("ASGI_CHUNKS", 16))
+
+class Events(object):
+
+    # One subscription per process, fanned out to every waiting connection
+
+    def __init__(self, redis, channel):
+
+        self.redis = redis
+        self.channel = channel
+
+        self.queues = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self):
+
+        queue = (asyncio.get_event_loop(), asyncio.Queue())
+
+        with self.lock:
+            self.queues.add(queue)
+
+        return queue
+
+    def unsubscribe(self, queue):
+
+        with self.lock:
+            self.queues.discard(queue)
+
+    def publish(self, data):
+
+        with self.lock:
+            queues = list(self.queues)
+
+        for loop, queue in queues:
+            loop.call_soon_threadsafe(queue.put_nowait, data)
+
+    def run(self):
+
+        while True:
+
+            try:
+
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+
+                for message in pubsub.listen():
+                    self.publish(service.event_data(message))
+
+            except Exception:
+                time.sleep(1)
+
+    def start(self):
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+class App(object):
+
+    def __init__(self, app, threads=ASGI_THREADS):
+
+        self.app = app
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+
+        self.events = Events(app.data.redis, service.EVENT_CHANNEL)
+        self.events.start()
+
+    @staticmethod
+    def header(scope, name):
+
+        for key, value in scope.get("headers", []):
+            if key.decode("latin-1").lower() == name:
+                return value.decode("latin-1")
+
+        return None
+
+    @staticmethod
+    def environ(scope, body):
+
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", ""),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False
+        }
+
+        for key, value in scope.get("headers", []):
+
+            name = key.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+
+            if name not in ["CONTENT_TYPE", "CONTENT_LENGTH"]:
+                name = f"HTTP_{name}"
+
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+
+        return environ
+
+    async def __call__(self, scope, receive, send):
+
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["method"] == "GET" and scope["path"] == "/event":
+            return await self.event(scope, receive, send)
+
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+
+        while True:
+
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+
+            if message["type"] == "lifespan.shutdown":
+                self.pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def wsgi(self, scope, receive, send):
+
+        body = b""
+
+        while True:
+
+            message = await receive()
+            body += message.get("body", b"")
+
+            if not message.get("more_body"):
+                break
+
+        # The whole request, streamed body included, runs on one thread, as
+        # Flask's context and the scoped MySQL session are both thread local
+
+        # Bounded, so a slow client holds the thread back rather than the
+        # whole response piling up in memory here
+
+        loop = asyncio.get_event_loop()
+        chunks = asyncio.Queue(maxsize=ASGI_CHUNKS)
+        started = []
+        gone = threading.Event()
+
+        def put(chunk):
+            if not gone.is_set():
+                asyncio.run_coroutine_threadsafe(chunks.put(chunk), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+            return put
+
+        def run():
+
+            try:
+
+                iterable = self.app(self.environ(scope, body), start_response)
+
+                try:
+                    for chunk in iterable:
+                        if gone.is_set():
+                            break
+                        if chunk:
+                            put(chunk)
+                finally:
+                    if hasattr(iterable, "close"):
+                        iterable.close()
+
+            finally:
+                put(None)
+
+        running = loop.run_in_executor(self.pool, run)
+        sent = False
+
+        try:
+
+            while True:
+
+                chunk = await chunks.get()
+
+                if chunk is None:
+                    break
+
+                if not sent:
+                    await self.start(send, *started)
+                    sent = True
+
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        except BaseException:
+
+            # Let a thread blocked on a full queue go so it can stop
+
+            gone.set()
+
+            while not chunks.empty():
+                chunks.get_nowait()
+
+            raise
+
+        await running
+
+        if not sent:
+            await self.start(send, *started)
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    @staticmethod
+    async def start(send, status, headers):
+
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers]
+        })
+
+    async def event(self, scope, receive, send):
+
+        # Mirrors service.event_stream, which stays the reference
+
+        began = time.time()
+        query = urllib.parse.parse_qs(scope["query_string"].decode("latin-1"))
+
+        try:
+            timeout = int(query["timeout"][0]) if "timeout" in query else service.EVENT_TIMEOUT
+        except ValueError:
+            return await self.respond(send, "400 Bad Request", {"message": "timeout must be an integer"})
+
+        timeout = min(max(timeout, 0), 300)
+
+        accept = werkzeug.http.parse_accept_header(self.header(scope, "accept"), werkzeug.datastructures.MIMEAccept)
+
+        queue = self.events.subscribe()
+        deadline = time.time() + timeout
+
+        disconnected = asyncio.ensure_future(self.disconnected(receive))
+
+        try:
+
+            if accept.best == "text/event-stream":
+                await self.stream(send, queue[1], deadline, disconnected)
+            else:
+                await self.poll(send, queue[1], deadline)
+
+        finally:
+            disconnected.cancel()
+            self.events.unsubscribe(queue)
+            self.app.metrics.record("service_event_stream", 200, time.time() - began)
+
+    @staticmethod
+    async def disconnected(receive):
+
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def stream(self, send, queue, deadline, disconnected):
+
+        await self.start(send, "200 OK", [
+            ("Content-Type", "text/event-stream; charset=utf-8"),
+            ("Cache-Control", "no-cache"),
+            ("X-Accel-Buffering", "no")
+        ])
+
+        await send({"type": "http.response.body", "body": f"retry: {service.EVENT_RETRY}\n\n".encode(), "more_body": True})
+
+        while time.time() < deadline and not disconnected.done():
+
+            try:
+                data = await asyncio.wait_for(queue.get(), timeout=min(1.0, max(deadline - time.time(), 0)))
+                chunk = f"data: {data}\n\n"
+            except asyncio.TimeoutError:
+                chunk = ":\n\n"
+
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def poll(self, send, queue, deadline):
+
+        # Long poll, wait for the first event then drain whatever else arrived
+
+        events = []
+
+        try:
+            events.append(json.loads(await asyncio.wait_for(queue.get(), timeout=max(deadline - time.time(), 0))))
+        except asyncio.TimeoutError:
+            pass
+
+        while not queue.empty():
+            events.append(json.loads(queue.get_nowait()))
+
+        await self.respond(send, "200 OK", {"events": events})
+
+    async def respond(self, send, status, body):
+
+        encoded = service.json_encode(body)
+
+        await self.start(send, status, [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(encoded)))
+        ])
+
+        await send({"type": "http.response.body", "body": encoded, "more_body": False})
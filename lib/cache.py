@@ -0,0 +1,234 @@
+import os
+import time
+import threading
+import collections
+
+# A bounded in-process LRU. With a ttl, entries older than it are treated as
+# missing, putting a hard limit on how stale anything served from it can be
+
+class LRU(object):
+
+    def __init__(self, size, ttl=None):
+
+        self.size = size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+
+        return len(self.entries)
+
+    def get(self, key, default=None):
+
+        with self.lock:
+
+            if key not in self.entries:
+                self.misses += 1
+                return default
+
+            value, stored = self.entries[key]
+
+            if self.ttl is not None and time.time() - stored > self.ttl:
+                del self.entries[key]
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value):
+
+        with self.lock:
+
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def purge(self, match):
+
+        with self.lock:
+            for key in [key for key in self.entries if match(key)]:
+                del self.entries[key]
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+
+        return {
+            "size": len(self.entries),
+            "max": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+# A read-through cache shared by every replica in Redis. Only one caller per
+# key loads on a miss, holding a short lock in Redis while it does, and the
+# rest wait briefly for its value rather than all going to the database. Any
+# Redis failure falls back to loading, the cache is never worth an error.
+#
+# Entries are keyed on a version at every level of their key, one for the
+# whole kind and one for the entity, that writes bump rather than deleting
+# anything, so a reader that loaded just before a write can only store its
+# stale value under a version nobody will ask for again. A bump sets a fresh
+# random version rather than counting, so versions can expire, twice as slow
+# as entries. One that's gone just means a cold key, as nothing stored under
+# the version it replaced can have outlived it
+
+RELEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+class Redis(object):
+
+    def __init__(self, client, prefix, ttl=60, lock=2, wait=0.01):
+
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.lock = lock
+        self.wait = wait
+
+        self.counts = collections.Counter()
+        self.counter = threading.Lock()
+
+    def count(self, stat):
+
+        with self.counter:
+            self.counts[stat] += 1
+
+    def key(self, *parts):
+
+        return "/".join([self.prefix] + [str(part) for part in parts])
+
+    def get(self, key):
+
+        try:
+            value = self.client.get(key)
+        except Exception:
+            self.count("errors")
+            return None
+
+        self.count("misses" if value is None else "hits")
+
+        return value.encode() if isinstance(value, str) else value
+
+    def set(self, key, value):
+
+        try:
+            self.client.set(key, value, ex=self.ttl)
+        except Exception:
+            self.count("errors")
+
+    def versioned(self, *parts):
+
+        if self.ttl <= 0:
+            return None
+
+        try:
+            versions = self.client.mget([self.key(*parts[:level], "version") for level in range(1, len(parts) + 1)])
+        except Exception:
+            self.count("errors")
+            return None
+
+        return self.key(*parts, ".".join(
+            (version.decode() if isinstance(version, bytes) else version) or "0" for version in versions
+        ))
+
+    def bump(self, *parts):
+
+        if self.ttl <= 0:
+            return
+
+        try:
+            self.client.set(self.key(*parts, "version"), os.urandom(4).hex(), ex=self.ttl * 2)
+        except Exception:
+            self.count("errors")
+
+    def release(self, locked, token):
+
+        # Only our own lock, which may have expired and been taken by another
+
+        try:
+            self.client.eval(RELEASE, 1, locked, token)
+        except Exception:
+            self.count("errors")
+
+    def fetch(self, key, load):
+
+        if key is None or self.ttl <= 0:
+            return load()
+
+        value = self.get(key)
+
+        if value is not None:
+            return value
+
+        locked = f"{key}/lock"
+        token = os.urandom(16).hex()
+        deadline = time.time() + self.lock
+
+        try:
+
+            while not self.client.set(locked, token, nx=True, px=int(self.lock * 1000)):
+
+                self.count("waits")
+                time.sleep(self.wait)
+
+                value = self.client.get(key)
+
+                if value is not None:
+                    return value.encode() if isinstance(value, str) else value
+
+                if time.time() > deadline:
+                    return load()
+
+        except Exception:
+            self.count("errors")
+            return load()
+
+        try:
+            value = load()
+            self.set(key, value)
+        finally:
+            self.release(locked, token)
+
+        return value
+
+    def stats(self):
+
+        with self.counter:
+            counts = dict(self.counts)
+
+        hits = counts.get("hits", 0)
+        misses = counts.get("misses", 0)
+
+        return {
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "waits": counts.get("waits", 0),
+            "errors": counts.get("errors", 0),
+            "ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0
+        }
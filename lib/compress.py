@@ -0,0 +1,234 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import cache
+
+# WSGI middleware compressing responses for clients that accept it. Buffered
+# bodies are compressed in one go, cached by ETag when they have one, while
+# streamed bodies are compressed chunk by chunk as they're produced
+
+COMPRESSIBLE = ["application/json", "application/x-ndjson", "text/plain", "text/html", "application/x-yaml"]
+
+def accepted(header):
+
+    encodings = {}
+
+    for part in header.split(","):
+
+        pieces = [piece.strip() for piece in part.split(";")]
+
+        if not pieces[0]:
+            continue
+
+        quality = 1.0
+
+        for piece in pieces[1:]:
+            if piece.startswith("q="):
+                try:
+                    quality = float(piece[2:])
+                except ValueError:
+                    quality = 0.0
+
+        encodings[pieces[0].lower()] = quality
+
+    return encodings
+
+def negotiate(header):
+
+    encodings = accepted(header)
+
+    for encoding in (["br"] if brotli is not None else []) + ["gzip"]:
+        if encodings.get(encoding, encodings.get("*", 0)) > 0:
+            return encoding
+
+    return None
+
+class Compressor(object):
+
+    def __init__(self, encoding, level):
+
+        self.encoding = encoding
+
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=min(level, 11))
+        else:
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+
+        if self.encoding == "br":
+            return self.compressor.process(chunk)
+
+        return self.compressor.compress(chunk)
+
+    def flush(self):
+
+        if self.encoding == "br":
+            return self.compressor.finish()
+
+        return self.compressor.flush()
+
+class Compress(object):
+
+    def __init__(self, app, minimum=512, level=6, size=256):
+
+        self.app = app
+        self.minimum = minimum
+        self.level = level
+        self.cache = cache.LRU(size)
+
+    @staticmethod
+    def header(headers, name):
+
+        for key, value in headers:
+            if key.lower() == name:
+                return value
+
+        return None
+
+    def negotiable(self, status, headers):
+
+        if not status.startswith("2") or status.startswith("204"):
+            return False
+
+        if self.header(headers, "content-encoding") is not None:
+            return False
+
+        content_type = (self.header(headers, "content-type") or "").split(";")[0].strip()
+
+        return content_type in COMPRESSIBLE
+
+    def compressible(self, status, headers):
+
+        if not self.negotiable(status, headers):
+            return False
+
+        # An empty body isn't worth the gzip header it'd gain
+
+        length = self.header(headers, "content-length")
+
+        return length is None or int(length) >= max(self.minimum, 1)
+
+    @staticmethod
+    def varied(headers):
+
+        # Anything that could have been compressed varies on Accept-Encoding,
+        # whether or not this particular response was
+
+        vary = Compress.header(headers, "vary")
+
+        if vary is None:
+            return headers + [("Vary", "Accept-Encoding")]
+
+        if "accept-encoding" in vary.lower():
+            return headers
+
+        return [(key, value) for key, value in headers if key.lower() != "vary"] + [("Vary", f"{vary}, Accept-Encoding")]
+
+    def compress(self, encoding, body, etag=None, resource=None):
+
+        # An ETag only identifies a representation of one URL, so the cache is
+        # keyed on the URL too or two resources sharing a tag would get each
+        # other's bodies
+
+        key = (resource, etag, encoding)
+
+        if etag is not None:
+
+            compressed = self.cache.get(key)
+
+            if compressed is not None:
+                return compressed
+
+        compressor = Compressor(encoding, self.level)
+        compressed = compressor.compress(body) + compressor.flush()
+
+        if etag is not None:
+            self.cache.set(key, compressed)
+
+        return compressed
+
+    def stream(self, encoding, iterable):
+
+        compressor = Compressor(encoding, self.level)
+
+        try:
+
+            for chunk in iterable:
+
+                compressed = compressor.compress(chunk)
+
+                if compressed:
+                    yield compressed
+
+            yield compressor.flush()
+
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    def __call__(self, environ, start_response):
+
+        # HEAD has no body to compress, and what it does send has to describe
+        # a body, so it's left as the identity response would be
+
+        encoding = negotiate(environ.get("HTTP_ACCEPT_ENCODING", "")) if environ.get("REQUEST_METHOD") != "HEAD" else None
+
+        if encoding is None:
+
+            def identity(status, headers, exc_info=None):
+                return start_response(status, self.varied(headers) if self.negotiable(status, headers) else headers, exc_info)
+
+            return self.app(environ, identity)
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None
+
+        iterable = self.app(environ, capture)
+        status, headers, exc_info = captured
+
+        if not self.compressible(status, headers):
+            start_response(status, self.varied(headers) if self.negotiable(status, headers) else headers, exc_info)
+            return iterable
+
+        # A different encoding is different bytes, so the tag becomes weak as
+        # conditional requests compare If-None-Match weakly anyway
+
+        etag = self.header(headers, "etag")
+
+        original = headers
+
+        headers = self.varied([
+            (key, value) for key, value in headers
+            if key.lower() not in ["content-length", "etag"]
+        ]) + [("Content-Encoding", encoding)]
+
+        if etag is not None:
+            headers.append(("ETag", etag if etag.startswith("W/") else f"W/{etag}"))
+
+        if self.header(original, "content-length") is None:
+            start_response(status, headers, exc_info)
+            return self.stream(encoding, iterable)
+
+        try:
+            body = b"".join(iterable)
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+        if not body:
+            start_response(status, self.varied(original), exc_info)
+            return [body]
+
+        compressed = self.compress(encoding, body, etag, (environ.get("PATH_INFO"), environ.get("QUERY_STRING")))
+
+        start_response(status, headers + [("Content-Length", str(len(compressed)))], exc_info)
+
+        return [compressed]
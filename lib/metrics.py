@@ -0,0 +1,132 @@
+import math
+import time
+import threading
+import collections
+
+# Aggregates request metrics in process and hands them to a Graphite sender in
+# batches from a background thread, so nothing is sent on the request path
+
+def percentile(values, percent):
+
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+
+    return ordered[max(0, math.ceil(percent / 100.0 * len(ordered)) - 1)]
+
+class Metrics(object):
+
+    def __init__(self, sender=None, interval=10, samples=10000):
+
+        self.sender = sender
+        self.interval = interval
+        self.samples = samples
+
+        self.lock = threading.Lock()
+        self.thread = None
+
+        self.operations = {}
+        self.counters = collections.Counter()
+        self.gauges = {}
+
+    def operation(self, name):
+
+        if name not in self.operations:
+            self.operations[name] = {
+                "count": 0,
+                "statuses": collections.Counter(),
+                "latencies": [],
+                "timings": collections.Counter()
+            }
+
+        return self.operations[name]
+
+    def record(self, name, status, latency, timings=None):
+
+        with self.lock:
+
+            operation = self.operation(name)
+
+            operation["count"] += 1
+            operation["statuses"][status] += 1
+
+            if len(operation["latencies"]) < self.samples:
+                operation["latencies"].append(latency)
+
+            for kind, seconds in (timings or {}).items():
+                operation["timings"][kind] += seconds
+
+    def count(self, name, value=1):
+
+        with self.lock:
+            self.counters[name] += value
+
+    def gauge(self, name, function):
+
+        self.gauges[name] = function
+
+    def collect(self):
+
+        with self.lock:
+            operations, self.operations = self.operations, {}
+            counters, self.counters = self.counters, collections.Counter()
+
+        collected = []
+
+        for name, operation in sorted(operations.items()):
+
+            collected.append((f"{name}.count", operation["count"]))
+
+            for status, count in sorted(operation["statuses"].items()):
+                collected.append((f"{name}.status.{status}", count))
+
+            for percent in [50, 95, 99]:
+                collected.append((f"{name}.latency.p{percent}", percentile(operation["latencies"], percent)))
+
+            for kind, seconds in sorted(operation["timings"].items()):
+                collected.append((f"{name}.{kind}", seconds / operation["count"]))
+
+        for name, value in sorted(counters.items()):
+            collected.append((name, value))
+
+        for name, function in sorted(self.gauges.items()):
+
+            try:
+                collected.append((name, function()))
+            except Exception:
+                pass
+
+        return collected
+
+    def flush(self):
+
+        if self.sender is None:
+            return
+
+        timestamp = time.time()
+
+        # One message and so one connection for the lot, sending line by line
+        # would connect to Graphite once per metric
+
+        message = b"".join(self.sender.build_message(name, value, timestamp) for name, value in self.collect())
+
+        if message:
+            self.sender.send_message(message)
+
+    def run(self):
+
+        while True:
+
+            time.sleep(self.interval)
+
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def start(self):
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import threading
+import collections
+
+# A sampling profiler for a single thread. It walks that thread's stack from
+# a helper thread at a fixed interval and counts the stacks it sees, written
+# out in the collapsed format flamegraph.pl and speedscope both read
+
+class Sampler(object):
+
+    def __init__(self, thread_id=None, interval=0.001):
+
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+
+        self.stacks = collections.Counter()
+        self.running = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def frame(frame):
+
+        return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+    def sample(self):
+
+        frame = sys._current_frames().get(self.thread_id)
+
+        if frame is None:
+            return
+
+        stack = []
+
+        while frame is not None:
+            stack.append(self.frame(frame))
+            frame = frame.f_back
+
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def run(self):
+
+        while self.running.is_set():
+            self.sample()
+            time.sleep(self.interval)
+
+    def start(self):
+
+        self.running.set()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+
+        self.running.clear()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        return self.stacks
+
+    def collapsed(self):
+
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def write(self, path):
+
+        with open(path, "w") as collapsed_file:
+            collapsed_file.write(self.collapsed())
@@ -1,20 +1,419 @@
 import os
+import time
+import random
 import yaml
+import socket
+import graphyte
+import functools
+import contextlib
+import threading
+import collections
+import concurrent.futures
 import json
 import flask
+import decimal
+import base64
+import hmac
+import hashlib
+import datetime
 import connexion
+import sqlalchemy
+import sqlalchemy.orm
+import sqlalchemy.pool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 import nandy.data
+import nandy.store.mysql
+
+import cache
+import metrics
+import compress
+import sampler
+import spec
+
+SPEC_DIR = os.environ.get("SPEC_DIR", "/opt/pi-k8s/openapi")
+
+YAML_CACHE = cache.LRU(int(os.environ.get("YAML_CACHE_SIZE", 1024)))
+RESPONSE_CACHE = cache.LRU(int(os.environ.get("RESPONSE_CACHE_SIZE", 256)))
+
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "orjson" if orjson is not None else "json")
+
+# Asked for orjson but it isn't installed, fall back like YAML does rather
+# than fail every response
+
+if JSON_BACKEND == "orjson" and orjson is None:
+    JSON_BACKEND = "json"
+
+SETTINGS_PATH = os.environ.get("SETTINGS_PATH", "/opt/pi-k8s/config/settings.yaml")
+SETTINGS = None
+
+EVENT_CHANNEL = os.environ.get("EVENT_CHANNEL", "nandy-api/event")
+EVENT_TIMEOUT = int(os.environ.get("EVENT_TIMEOUT", 30))
+EVENT_RETRY = int(os.environ.get("EVENT_RETRY", 1000))
+
+# Every open /event holds one of the worker's threads for up to its timeout,
+# so only so many may be open at once, half the threads unless told otherwise,
+# leaving the rest for everything else
+
+EVENT_LIMIT = int(os.environ.get("EVENT_LIMIT", max(1, int(os.environ.get("API_THREADS", 1)) // 2)))
+EVENT_SLOTS = threading.BoundedSemaphore(EVENT_LIMIT)
+
+MYSQL_POOL_SIZE = int(os.environ.get("MYSQL_POOL_SIZE", 5))
+MYSQL_MAX_OVERFLOW = int(os.environ.get("MYSQL_MAX_OVERFLOW", 5))
+MYSQL_POOL_RECYCLE = int(os.environ.get("MYSQL_POOL_RECYCLE", 3600))
+MYSQL_POOL_PRE_PING = os.environ.get("MYSQL_POOL_PRE_PING", "true").lower() == "true"
+MYSQL_POOL_TIMEOUT = float(os.environ.get("MYSQL_POOL_TIMEOUT", 10))
+
+RETRIEVE_PREFIX = os.environ.get("RETRIEVE_PREFIX", "nandy-api/retrieve")
+RETRIEVE_TTL = int(os.environ.get("RETRIEVE_TTL", 0))
+RETRIEVE_LOCK = float(os.environ.get("RETRIEVE_LOCK", 2))
+
+LOCAL_SIZE = int(os.environ.get("LOCAL_SIZE", 512))
+LOCAL_TTL = float(os.environ.get("LOCAL_TTL", 0))
+
+CHORE_ACTIONS = ["next", "pause", "unpause", "skip", "unskip", "complete", "incomplete"]
+TASK_ACTIONS = ["pause", "unpause", "skip", "unskip", "complete", "incomplete"]
+ACTION_AFFECTS = ["chore", "act"]
+
+LIST_LIMIT = int(os.environ.get("LIST_LIMIT", 100))
+
+# Lists come back in the order NandyData's own *_list() returns them, whether
+# whole, filtered, paged or streamed, with the primary key breaking ties
+
+LIST_ORDER = {
+    nandy.store.mysql.Person: ("name", False),
+    nandy.store.mysql.Area: ("name", False),
+    nandy.store.mysql.Template: ("name", False),
+    nandy.store.mysql.Chore: ("created", True),
+    nandy.store.mysql.Act: ("created", True)
+}
+STREAM_ROWS = int(os.environ.get("STREAM_ROWS", 500))
+STREAM_CHUNK = int(os.environ.get("STREAM_CHUNK", 100))
+
+METRICS_INTERVAL = float(os.environ.get("METRICS_INTERVAL", 10))
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+PROFILE_RATE = float(os.environ.get("PROFILE_RATE", 0))
+PROFILE_HEADER = os.environ.get("PROFILE_HEADER", "X-Profile")
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+
+HEALTH_TTL = float(os.environ.get("HEALTH_TTL", 2))
+HEALTH_TIMEOUT = float(os.environ.get("HEALTH_TIMEOUT", 0.5))
+HEALTH_PROBES = concurrent.futures.ThreadPoolExecutor(max_workers=3)
+HEALTH_RUNNING = {}
+HEALTH_LOCK = threading.Lock()
+HEALTH = None
+
+# Use libyaml when PyYAML was built against it, but only if it renders exactly
+# like the pure Python emitter so responses don't change between nodes
+
+YAML_PROBE = {"a": [1, "b", {"c": None, "d": True}], "e": "f g: h", "i": 1.5}
+
+YAML_BACKEND = "python"
+YAML_LOADER = yaml.SafeLoader
+YAML_DUMPER = yaml.SafeDumper
+
+if hasattr(yaml, "CSafeLoader") and hasattr(yaml, "CSafeDumper"):
+
+    try:
+        if (
+            yaml.dump(YAML_PROBE, Dumper=yaml.CSafeDumper, default_flow_style=False) ==
+            yaml.dump(YAML_PROBE, Dumper=yaml.SafeDumper, default_flow_style=False) and
+            yaml.load("a: [1, b]", Loader=yaml.CSafeLoader) == {"a": [1, "b"]}
+        ):
+            YAML_BACKEND = "libyaml"
+            YAML_LOADER = yaml.CSafeLoader
+            YAML_DUMPER = yaml.CSafeDumper
+    except Exception:
+        pass
 
 def app():
 
-    app = connexion.App("service", specification_dir='/opt/pi-k8s/openapi')
-    app.add_api('service.yaml')
+    app = connexion.App("service", specification_dir=SPEC_DIR)
+    app.add_api(spec.load(SPEC_DIR))
 
+    app.app.json_encoder = JSONEncoder
     app.app.data = nandy.data.NandyData()
 
+    mysql_pool(app.app.data)
+    app.app.teardown_appcontext(mysql_release)
+
+    app.app.metrics = metrics.Metrics(
+        graphyte.Sender(
+            os.environ["GRAPHITE_HOST"],
+            port=int(os.environ.get("GRAPHITE_PORT", 2003)),
+            prefix="nandy.api"
+        ) if "GRAPHITE_HOST" in os.environ else None,
+        interval=METRICS_INTERVAL
+    )
+
+    for stat in ["size", "hits", "misses", "evictions"]:
+        app.app.metrics.gauge(f"cache.yaml.{stat}", functools.partial(lambda stat: YAML_CACHE.stats()[stat], stat))
+
+    app.app.retrieve = cache.Redis(app.app.data.redis, RETRIEVE_PREFIX, ttl=RETRIEVE_TTL, lock=RETRIEVE_LOCK)
+
+    for stat in ["hits", "misses", "waits", "errors", "ratio"]:
+        app.app.metrics.gauge(f"cache.retrieve.{stat}", functools.partial(lambda stat: app.app.retrieve.stats()[stat], stat))
+
+    for stat in ["size", "checkedout", "overflow", "waits", "waited"]:
+        app.app.metrics.gauge(f"mysql.pool.{stat}", functools.partial(lambda stat: mysql_stats(app.app.data)[stat], stat))
+
+    app.app.local = cache.LRU(LOCAL_SIZE, ttl=LOCAL_TTL)
+    app.app.generations = collections.Counter()
+
+    for stat in ["size", "hits", "misses", "evictions"]:
+        app.app.metrics.gauge(f"cache.local.{stat}", functools.partial(lambda stat: app.app.local.stats()[stat], stat))
+
+    if LOCAL_TTL > 0:
+        threading.Thread(target=local_listen, args=(app.app,), daemon=True).start()
+
+    app.app.before_request(request_start)
+    app.app.after_request(request_record)
+
+    sqlalchemy.event.listen(app.app.data.mysql.engine, "before_cursor_execute", query_start)
+    sqlalchemy.event.listen(app.app.data.mysql.engine, "after_cursor_execute", query_record)
+
+    app.app.metrics.start()
+
+    app.app.compress = compress.Compress(
+        app.app.wsgi_app,
+        minimum=int(os.environ.get("COMPRESS_MINIMUM", 512)),
+        level=int(os.environ.get("COMPRESS_LEVEL", 6)),
+        size=int(os.environ.get("COMPRESS_CACHE_SIZE", 256))
+    )
+    app.app.wsgi_app = app.app.compress
+
+    for stat in ["size", "hits", "misses", "evictions"]:
+        app.app.metrics.gauge(f"cache.compress.{stat}", functools.partial(lambda stat: app.app.compress.cache.stats()[stat], stat))
+
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        app.app.before_request(profile_start)
+        app.app.after_request(profile_stop)
+
     return app
 
+# NandyData hands back one engine and one session for everything, which only
+# works with a single thread. The engine keeps everything NandyData set it up
+# with but gets a sized pool, built like the engine's own dispose() rebuilds
+# one, and the session is made thread local with the same options. Tearing
+# down a request just ends its transaction, handing the connection back to
+# the pool, without closing the session, so anything loaded outside requests
+# on the same thread stays attached. The data layer only ever sees
+# data.mysql.session, which the scoped session proxies
+
+class Pool(sqlalchemy.pool.QueuePool):
+
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        self.waits = 0
+        self.waited = 0.0
+
+    def _do_get(self):
+
+        start = time.time()
+
+        try:
+            return super()._do_get()
+        finally:
+
+            waited = time.time() - start
+
+            self.waits += 1
+            self.waited += waited
+
+            if flask.has_request_context() and getattr(flask.g, "timings", None) is not None:
+                flask.g.timings["pool"] += waited
+
+def mysql_pool(data):
+
+    engine = data.mysql.engine
+    session = data.mysql.session
+    pool = engine.pool
+
+    session.close()
+
+    engine.pool = Pool(
+        pool._creator,
+        pool_size=MYSQL_POOL_SIZE,
+        max_overflow=MYSQL_MAX_OVERFLOW,
+        recycle=MYSQL_POOL_RECYCLE,
+        pre_ping=MYSQL_POOL_PRE_PING,
+        timeout=MYSQL_POOL_TIMEOUT,
+        echo=pool.echo,
+        logging_name=pool._orig_logging_name,
+        reset_on_return=pool._reset_on_return,
+        dialect=pool._dialect,
+        _dispatch=pool.dispatch
+    )
+
+    pool.dispose()
+
+    data.mysql.session = sqlalchemy.orm.scoped_session(sqlalchemy.orm.sessionmaker(
+        bind=engine,
+        class_=type(session),
+        autoflush=session.autoflush,
+        autocommit=session.autocommit,
+        expire_on_commit=session.expire_on_commit,
+        query_cls=session._query_cls
+    ))
+
+def mysql_release(exception=None):
+
+    session = flask.current_app.data.mysql.session
+
+    if session.registry.has():
+        session.rollback()
+
+def mysql_stats(data):
+
+    pool = data.mysql.engine.pool
+
+    return {
+        "size": pool.size(),
+        "checkedout": pool.checkedout(),
+        "overflow": max(0, pool.overflow()),
+        "waits": pool.waits,
+        "waited": pool.waited
+    }
+
+# Responses are encoded with orjson when it's installed, falling back to the
+# standard library, and both handle what SQLAlchemy columns hand back
+
+def json_default(value):
+
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+
+    if isinstance(value, bytes):
+        return value.decode()
+
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def json_encode(value):
+
+    if JSON_BACKEND == "orjson" and orjson is not None:
+        return orjson.dumps(value, default=json_default)
+
+    return json.dumps(value, default=json_default).encode()
+
+class JSONEncoder(flask.json.JSONEncoder):
+
+    def default(self, value):
+
+        try:
+            return json_default(value)
+        except TypeError:
+            return super().default(value)
+
+def json_response(body, status=200, headers=None):
+
+    if not isinstance(body, bytes):
+        body = json_encode(body)
+
+    return flask.Response(body, status=status, headers=headers, mimetype="application/json")
+
+# These time each request by operationId, along with how much of it went to
+# the database and to serializing models
+
+def request_operation():
+
+    if flask.request.url_rule is None:
+        return "unmatched"
+
+    return flask.request.url_rule.endpoint.rsplit(".", 1)[-1]
+
+def request_start():
+
+    flask.g.start = time.time()
+    flask.g.timings = collections.Counter()
+
+def request_record(response):
+
+    if getattr(flask.g, "start", None) is not None:
+        flask.current_app.metrics.record(
+            request_operation(),
+            response.status_code,
+            time.time() - flask.g.start,
+            flask.g.timings
+        )
+
+    return response
+
+def query_start(connection, cursor, statement, parameters, context, executemany):
+
+    if flask.has_request_context():
+        flask.g.query = time.time()
+
+def query_record(connection, cursor, statement, parameters, context, executemany):
+
+    if flask.has_request_context() and getattr(flask.g, "query", None) is not None:
+        flask.g.timings["data"] += time.time() - flask.g.query
+        flask.g.query = None
+
+# Profiling is only hooked in when PROFILE_DIR is set, and then only samples
+# requests that win the PROFILE_RATE draw or ask for it with the header. As
+# each profile costs a disk write, asking only works with PROFILE_TOKEN set
+# and sent as the header's value
+
+def profile_asked():
+
+    if not PROFILE_TOKEN:
+        return False
+
+    return hmac.compare_digest(flask.request.headers.get(PROFILE_HEADER, "").encode(), PROFILE_TOKEN.encode())
+
+def profile_start():
+
+    if profile_asked() or random.random() < PROFILE_RATE:
+        flask.g.sampler = sampler.Sampler()
+        flask.g.sampler.start()
+
+def profile_stop(response):
+
+    if getattr(flask.g, "sampler", None) is not None:
+
+        flask.g.sampler.stop()
+        flask.g.sampler.write(os.path.join(
+            PROFILE_DIR,
+            f"{int(time.time() * 1000)}-{request_operation()}-{os.getpid()}.collapsed"
+        ))
+        flask.g.sampler = None
+
+    return response
+
+def timed(kind):
+
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+
+            if not flask.has_request_context() or getattr(flask.g, "timings", None) is None or getattr(flask.g, "timing", False):
+                return function(*args, **kwargs)
+
+            flask.g.timing = True
+            start = time.time()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                flask.g.timings[kind] += time.time() - start
+                flask.g.timing = False
+
+        return wrapper
+
+    return decorator
+
 # These are for sending and recieving model data as dicts
 
 def model_in(converted):
@@ -24,234 +423,1101 @@ def model_in(converted):
     for field in converted.keys():
 
         if field == "yaml":
-            fields["data"] = yaml.load(converted[field])
+            fields["data"] = yaml.load(converted[field], Loader=YAML_LOADER)
         else:
             fields[field] = converted[field]
 
     return fields
 
-def model_out(model):
+def model_yaml(model, data):
+
+    # Keyed on the content of data so a mutated row can never be served a
+    # stale rendering, and unchanged rows skip the YAML emitter entirely
+
+    key = (
+        model.__class__.__name__,
+        tuple(getattr(model, column.name) for column in model.__table__.primary_key.columns),
+        hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    )
+
+    rendered = YAML_CACHE.get(key)
+
+    if rendered is None:
+        rendered = yaml.dump(data, Dumper=YAML_DUMPER, default_flow_style=False)
+        YAML_CACHE.set(key, rendered)
+
+    return rendered
+
+def model_field(field, fields=None, exclude=None):
+
+    return (not fields or field in fields) and (not exclude or field not in exclude)
+
+@timed("serialize")
+def model_out(model, fields=None, exclude=None):
 
     converted = {}
 
     for field in model.__table__.columns._data.keys():
 
-        converted[field] = getattr(model, field)
+        if model_field(field, fields, exclude):
+            converted[field] = getattr(model, field)
 
-        if field == "data":
-            converted["yaml"] = yaml.dump(dict(converted[field]), default_flow_style=False)
+        if field == "data" and model_field("yaml", fields, exclude):
+            converted["yaml"] = model_yaml(model, dict(getattr(model, field)))
 
     return converted
 
-def models_out(models):
+@timed("serialize")
+def models_out(models, fields=None, exclude=None):
+
+    return [model_out(model, fields, exclude) for model in models]
+
+# Strong ETags from the stored column values, so a matching If-None-Match can
+# be answered with a 304 before anything is converted or rendered
+
+def model_tag(model):
+
+    return hashlib.sha1(json.dumps(
+        [model.__class__.__name__] + [getattr(model, field) for field in model.__table__.columns._data.keys()],
+        sort_keys=True,
+        default=str
+    ).encode()).hexdigest()
+
+def models_tag(models):
+
+    # Seeded with the path as well as the query so empty lists on different
+    # endpoints, which share RESPONSE_CACHE, never share a tag
+
+    tag = hashlib.sha1(flask.request.path.encode() + b"?" + flask.request.query_string)
+
+    for model in models:
+        tag.update(model_tag(model).encode())
+
+    return tag.hexdigest()
+
+def conditional(tag, build, status=200):
+
+    headers = {"ETag": f'"{tag}"'}
+
+    if flask.request.if_none_match.contains_weak(tag):
+        return flask.Response(status=304, headers=headers)
+
+    # The tag is derived from the content, so the encoded body stored under it
+    # can be served to any client without building or encoding it again
+
+    body = RESPONSE_CACHE.get(tag)
+
+    if body is None:
+
+        body = build()
+
+        if not isinstance(body, bytes):
+            body = json_encode(body)
+
+        RESPONSE_CACHE.set(tag, body)
+
+    return json_response(body, status, headers)
+
+# Single rows are read through Redis, stored as the 40 character tag followed
+# by the encoded body, so a hit on any replica needs neither MySQL nor any
+# decoding. Every write goes through changed(), which bumps the row's version
+
+def retrieved(kind, id, load):
+
+    def encoded():
+
+        model = load()
+
+        return model_tag(model).encode() + json_encode({kind: model_out(model)})
+
+    value = flask.current_app.local.get((kind, str(id))) if LOCAL_TTL > 0 else None
+
+    if value is None:
+
+        value = flask.current_app.retrieve.fetch(flask.current_app.retrieve.versioned(kind, id), encoded)
+
+        if LOCAL_TTL > 0:
+            flask.current_app.local.set((kind, str(id)), value)
+
+    return conditional(value[:40].decode(), lambda: value[40:])
+
+# Each worker keeps the hottest rows and list pages in memory too. Writes here
+# drop them straight away, writes on other replicas arrive over the event
+# channel, and the LRU's ttl caps how stale they can get if a message is lost.
+# List pages are keyed by a generation per kind so any change to a kind
+# orphans all its pages at once. No id means any row of the kind
+
+def local_invalidate(app, kind, id):
+
+    if id is None:
+        app.local.purge(lambda key: key[0] == kind)
+    else:
+        app.local.delete((kind, str(id)))
+
+    app.generations[kind] += 1
+
+def local_listen(app):
+
+    while True:
+
+        try:
+
+            pubsub = app.data.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(EVENT_CHANNEL)
+
+            # Anything could have changed while we weren't subscribed
+
+            app.local.clear()
+
+            for message in pubsub.listen():
+                event = json.loads(event_data(message))
+                local_invalidate(app, event["kind"], event["id"])
+
+        except Exception:
+            app.logger.exception("lost the event channel")
+            time.sleep(1)
+
+# Filters are turned into SQL criteria so the database does the work, lists
+# of values match any and (after, before) tuples are half open ranges
+
+def models_filter(model, person=None, node=None, **columns):
+
+    filters = []
+
+    if person:
+        filters.append(model.person_id.in_(
+            flask.current_app.data.mysql.session.query(nandy.store.mysql.Person.person_id).filter(
+                nandy.store.mysql.Person.name.in_(person)
+            )
+        ))
+
+    if node:
+        filters.append(sqlalchemy.func.json_unquote(sqlalchemy.func.json_extract(model.data, "$.node")).in_(node))
+
+    for name, value in columns.items():
+
+        column = getattr(model, name)
+
+        if isinstance(value, tuple):
+
+            if value[0] is not None:
+                filters.append(column >= value[0])
+
+            if value[1] is not None:
+                filters.append(column < value[1])
+
+        elif value:
+            filters.append(column.in_(value))
+
+    return filters
+
+# Keyset pagination on the list's own order so a page only ever loads its
+# own rows, no matter how deep into the table the cursor is. The cursor holds
+# the last row's sort value and primary key, so the next page starts right
+# after it even if that row's since changed or gone
+
+def models_order(model):
+
+    name, descending = LIST_ORDER[model]
+
+    return name, model.__mapper__.primary_key[0], descending
+
+def models_cursor(model, last):
+
+    name, primary, descending = models_order(model)
+
+    return base64.urlsafe_b64encode(json_encode([getattr(last, name), getattr(last, primary.name)])).decode().rstrip("=")
+
+def models_after(after):
+
+    value = json.loads(base64.urlsafe_b64decode((after + "=" * (-len(after) % 4)).encode()))
+
+    if not isinstance(value, list) or len(value) != 2:
+        raise ValueError(f"invalid cursor {after}")
+
+    return value
+
+def models_query(model, after=None, filters=None):
+
+    name, primary, descending = models_order(model)
+    column = getattr(model, name)
+
+    query = flask.current_app.data.mysql.session.query(model)
+
+    for criterion in filters or []:
+        query = query.filter(criterion)
+
+    if after is not None:
+
+        value, id = after
+
+        if descending:
+            query = query.filter(sqlalchemy.or_(column < value, sqlalchemy.and_(column == value, primary < id)))
+        else:
+            query = query.filter(sqlalchemy.or_(column > value, sqlalchemy.and_(column == value, primary > id)))
+
+    if descending:
+        return query.order_by(column.desc(), primary.desc())
+
+    return query.order_by(column, primary)
+
+def models_page(model, limit=None, after=None, filters=None):
+
+    query = models_query(model, after, filters)
+
+    if limit is None and after is None:
+        return query.all(), None
+
+    if limit is None:
+        limit = LIST_LIMIT
+
+    models = query.limit(limit + 1).all()
+
+    if len(models) <= limit:
+        return models, None
+
+    models = models[:limit]
+
+    return models, models_cursor(model, models[-1])
+
+# Large lists are streamed straight off a server side cursor, converting and
+# encoding a row at a time, so memory stays flat however big the table gets
+
+def models_streaming(model, limit=None, after=None, filters=None):
+
+    if flask.request.accept_mimetypes.best == "application/x-ndjson":
+        return "ndjson"
+
+    if limit is None and after is None and STREAM_ROWS and \
+       models_query(model, filters=filters).limit(STREAM_ROWS + 1).count() > STREAM_ROWS:
+        return "json"
+
+    return None
+
+def models_stream(model, plural, streaming, fields=None, exclude=None, limit=None, after=None, filters=None):
+
+    query = models_query(model, after, filters)
+    headers = {}
+
+    if limit is None and after is not None:
+        limit = LIST_LIMIT
+
+    # One row past the limit means there's another page, and next is where the
+    # last row sent left off. ndjson has nowhere after its rows to say so, so
+    # it gets an X-Next header, worked out up front from just the keys of the
+    # rows either side of the end of the page
+
+    if limit is not None:
+
+        if streaming == "ndjson":
+
+            name, primary, descending = models_order(model)
+            edge = query.with_entities(getattr(model, name), primary).offset(limit - 1).limit(2).all()
+
+            if len(edge) == 2:
+                headers["X-Next"] = models_cursor(model, edge[0])
+
+        query = query.limit(limit + 1)
+
+    query = query.execution_options(stream_results=True).yield_per(STREAM_CHUNK)
+    cursor = []
+
+    def rows():
+
+        last = None
+
+        for index, row in enumerate(query):
+
+            if limit is not None and index == limit:
+                cursor.append(models_cursor(model, last))
+                break
+
+            last = row
+
+            yield row
+
+    def ndjson():
+
+        for row in rows():
+            yield json_encode(model_out(row, fields, exclude)) + b"\n"
+
+    def array():
+
+        yield b'{"' + plural.encode() + b'": ['
+
+        separator = b""
+
+        for row in rows():
+            yield separator + json_encode(model_out(row, fields, exclude))
+            separator = b","
+
+        yield b'], "next": ' + json_encode(cursor[0] if cursor else None) + b'}'
+
+    if streaming == "ndjson":
+        return flask.Response(flask.stream_with_context(ndjson()), mimetype="application/x-ndjson", headers=headers)
+
+    return flask.Response(flask.stream_with_context(array()), mimetype="application/json")
+
+def models_list(model, plural, fields=None, exclude=None, limit=None, after=None, filters=None):
+
+    if after is not None:
+
+        try:
+            after = models_after(after)
+        except ValueError:
+            return {"message": "after must be the next of a previous page"}, 400
+
+    local = LOCAL_TTL > 0 and flask.request.accept_mimetypes.best != "application/x-ndjson"
+
+    if local:
+
+        kind = model.__name__.lower()
+        key = (plural, flask.current_app.generations[kind], flask.request.query_string)
+        page = flask.current_app.local.get(key)
+
+        if page is not None:
+            return conditional(page[0], lambda: page[1])
+
+    streaming = models_streaming(model, limit, after, filters)
+
+    if streaming:
+        return models_stream(model, plural, streaming, fields, exclude, limit, after, filters)
+
+    models, cursor = models_page(model, limit, after, filters)
+
+    tag = models_tag(models)
 
-    return [model_out(model) for model in models]
+    if not local:
+        return conditional(tag, lambda: {plural: models_out(models, fields, exclude), "next": cursor})
+
+    page = (tag, RESPONSE_CACHE.get(tag) or json_encode({plural: models_out(models, fields, exclude), "next": cursor}))
+    flask.current_app.local.set(key, page)
+
+    return conditional(page[0], lambda: page[1])
+
+# Bulk writes validate every item before touching the database and then
+# apply them all in one transaction, reporting a result per item. Each item
+# goes through the data layer's own create, update or delete so bulk writes
+# get whatever the single ones do
+
+def models_validate(model, items, primary=False):
+
+    columns = set(model.__table__.columns._data.keys()) | {"yaml"}
+    key = model.__mapper__.primary_key[0].name
+
+    errors = []
+
+    for index, item in enumerate(items):
+
+        if not isinstance(item, dict):
+            errors.append({"index": index, "error": "must be an object"})
+            continue
+
+        unknown = sorted(set(item.keys()) - columns)
+
+        if unknown:
+            errors.append({"index": index, "error": f"unknown fields {unknown}"})
+
+        if primary and key not in item:
+            errors.append({"index": index, "error": f"missing {key}"})
+
+        if primary and not set(item.keys()) - {key}:
+            errors.append({"index": index, "error": f"nothing to update besides {key}"})
+
+        if not primary and key in item:
+            errors.append({"index": index, "error": f"{key} can't be set"})
+
+    return errors
+
+# The data layer commits whenever it's changed something, however many times
+# one call takes. Inside here those commits only flush, so locks are held and
+# nothing's kept until the one real commit at the end
+
+@contextlib.contextmanager
+def models_transaction(session):
+
+    instance = session()
+    instance.commit = instance.flush
+
+    try:
+        yield
+    except Exception:
+        del instance.commit
+        session.rollback()
+        raise
+
+    del instance.commit
+    session.commit()
+
+def models_create(model, kind, plural):
+
+    items = flask.request.json[plural]
+    errors = models_validate(model, items)
+
+    if errors:
+        return {"errors": errors}, 400
+
+    create = getattr(flask.current_app.data, f"{kind}_create")
+
+    with models_transaction(flask.current_app.data.mysql.session):
+        models = [create(model_in(item)) for item in items]
+
+    key = model.__mapper__.primary_key[0].name
+
+    for created in models:
+        changed(kind, getattr(created, key), "create")
+
+    return {plural: models_out(models)}, 201
+
+def models_update(model, kind, plural):
+
+    items = flask.request.json[plural]
+    errors = models_validate(model, items, primary=True)
+
+    if errors:
+        return {"errors": errors}, 400
+
+    update = getattr(flask.current_app.data, f"{kind}_update")
+    key = model.__mapper__.primary_key[0].name
+
+    results = []
+
+    with models_transaction(flask.current_app.data.mysql.session):
+
+        for item in items:
+
+            fields = model_in(item)
+            id = fields.pop(key)
+
+            results.append({key: id, "updated": update(id, fields)})
+
+    for result in results:
+        changed(kind, result[key], "update", result["updated"])
+
+    return {plural: results}, 202
+
+def models_delete(model, kind, plural, ids):
+
+    delete = getattr(flask.current_app.data, f"{kind}_delete")
+    key = model.__mapper__.primary_key[0].name
+
+    with models_transaction(flask.current_app.data.mysql.session):
+        results = [{key: id, "deleted": delete(id)} for id in ids]
+
+    for result in results:
+        changed(kind, result[key], "delete", result["deleted"])
+
+    return {plural: results}, 202
+
+# Every write publishes a change on Redis so all replicas, and anything
+# listening on /event, hear about it no matter which pod handled it. An id of
+# None is a change to any number of rows of the kind
+
+def changed(kind, id, action, count=1):
+
+    if not count:
+        return
+
+    if flask.current_app.retrieve.ttl > 0:
+        if id is None:
+            flask.current_app.retrieve.bump(kind)
+        else:
+            flask.current_app.retrieve.bump(kind, id)
+
+    if LOCAL_TTL > 0:
+        local_invalidate(flask.current_app, kind, id)
+
+    try:
+        flask.current_app.data.redis.publish(EVENT_CHANNEL, json.dumps({
+            "kind": kind,
+            "id": id,
+            "action": action,
+            "at": time.time()
+        }))
+    except Exception:
+        flask.current_app.logger.exception("failed to publish change")
+
+# Actions on areas, chores and tasks can have the data layer write more than
+# the row they're on, creating or changing chores and acts, so those kinds
+# are marked changed as a whole
+
+def affected(action, count=1):
+
+    for kind in ACTION_AFFECTS:
+        changed(kind, None, action, count)
+
+def event_data(message):
+
+    data = message["data"]
+
+    return data.decode() if isinstance(data, bytes) else data
+
+def event_stream(timeout=None):
+
+    if timeout is None:
+        timeout = EVENT_TIMEOUT
+
+    slots = EVENT_SLOTS
+
+    if not slots.acquire(blocking=False):
+        return {"message": "too many event connections"}, 503, {"Retry-After": str(max(1, EVENT_RETRY // 1000))}
+
+    try:
+        pubsub = flask.current_app.data.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(EVENT_CHANNEL)
+    except Exception:
+        slots.release()
+        raise
+
+    deadline = time.time() + timeout
+
+    # The stream ends itself after the timeout, EventSource reconnects on its
+    # own, so an idle display never pins a worker thread indefinitely
+
+    if flask.request.accept_mimetypes.best == "text/event-stream":
+
+        def stream():
+
+            try:
+
+                yield f"retry: {EVENT_RETRY}\n\n"
+
+                while time.time() < deadline:
+
+                    message = pubsub.get_message(timeout=1.0)
+
+                    if message is not None:
+                        yield f"data: {event_data(message)}\n\n"
+                    else:
+                        yield ":\n\n"
+
+            finally:
+                pubsub.close()
+
+        response = flask.Response(stream(), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
+
+        # Closing the response frees the slot even if the stream never started
+
+        response.call_on_close(slots.release)
+
+        return response
+
+    # Long poll, wait for the first event then drain whatever else arrived
+
+    events = []
+
+    try:
+
+        while time.time() < deadline:
+
+            message = pubsub.get_message(timeout=max(deadline - time.time(), 0))
+
+            if message is None:
+                continue
+
+            events.append(json.loads(event_data(message)))
+
+            while True:
+
+                message = pubsub.get_message()
+
+                if message is None:
+                    break
+
+                events.append(json.loads(event_data(message)))
+
+            break
+
+    finally:
+        pubsub.close()
+        slots.release()
+
+    return {"events": events}
+
+# Settings are parsed once and held until the file changes. Kubernetes swaps
+# the ConfigMap symlink atomically, so a new inode or mtime means new content
 
 def setting_load():
 
-    with open("/opt/pi-k8s/config/settings.yaml", "r") as settings_file:
-        return yaml.load(settings_file)
+    global SETTINGS
+
+    stat = os.stat(SETTINGS_PATH)
+    signature = (stat.st_ino, stat.st_mtime, stat.st_size)
+
+    if SETTINGS is None or SETTINGS[0] != signature:
+
+        with open(SETTINGS_PATH, "r") as settings_file:
+            settings = yaml.load(settings_file, Loader=YAML_LOADER)
+
+        SETTINGS = (signature, settings, json_encode({"settings": settings}))
+
+    return SETTINGS[1]
 
 def health():
 
+    return {"message": "OK", "yaml": YAML_BACKEND, "json": JSON_BACKEND}
+
+def health_live():
+
     return {"message": "OK"}
 
+# Readiness probes each dependency with a tight timeout. A probe that's still
+# hung from last time isn't resubmitted, it just keeps reporting the timeout
+
+def health_mysql(data):
+
+    with data.mysql.engine.connect() as connection:
+        connection.execute(sqlalchemy.text("SELECT 1"))
+
+def health_redis(data):
+
+    data.redis.ping()
+
+def health_graphite(data):
+
+    socket.create_connection(
+        (os.environ["GRAPHITE_HOST"], int(os.environ.get("GRAPHITE_PORT", 2003))),
+        timeout=HEALTH_TIMEOUT
+    ).close()
+
+def health_probe(name, probe, data):
+
+    def timed():
+
+        start = time.time()
+        probe(data)
+        return time.time() - start
+
+    if name not in HEALTH_RUNNING or HEALTH_RUNNING[name].done():
+        HEALTH_RUNNING[name] = HEALTH_PROBES.submit(timed)
+
+    try:
+        return {"ok": True, "latency": round(HEALTH_RUNNING[name].result(timeout=HEALTH_TIMEOUT), 6)}
+    except concurrent.futures.TimeoutError:
+        return {"ok": False, "error": f"timed out after {HEALTH_TIMEOUT}s"}
+    except Exception as exception:
+        return {"ok": False, "error": str(exception)}
+
+def health_ready():
+
+    global HEALTH
+
+    with HEALTH_LOCK:
+
+        if HEALTH is None or HEALTH[0] < time.time():
+
+            data = flask.current_app.data
+
+            dependencies = {
+                "mysql": health_probe("mysql", health_mysql, data),
+                "redis": health_probe("redis", health_redis, data)
+            }
+
+            # Only what requests need decides readiness. Graphite is just where
+            # metrics go, so it's reported but an outage there mustn't pull
+            # every replica out of the Service
+
+            ready = all(dependency["ok"] for dependency in dependencies.values())
+
+            if "GRAPHITE_HOST" in os.environ:
+                dependencies["graphite"] = health_probe("graphite", health_graphite, data)
+
+            HEALTH = (time.time() + HEALTH_TTL, {"ready": ready, "dependencies": dependencies}, 200 if ready else 503)
+
+        return HEALTH[1], HEALTH[2]
+
+def cache_list():
+
+    return {"caches": {
+        "yaml": YAML_CACHE.stats(),
+        "response": RESPONSE_CACHE.stats(),
+        "compress": flask.current_app.compress.cache.stats(),
+        "retrieve": flask.current_app.retrieve.stats(),
+        "local": flask.current_app.local.stats()
+    }}
+
 def setting_list():
 
-    return {"settings": setting_load()}
+    setting_load()
+
+    return json_response(SETTINGS[2])
 
 def person_create():
 
-    return {
-        "person": model_out(
-            flask.current_app.data.person_create(
-                model_in(flask.request.json["person"])
-            )
-        )
-    }, 201
+    person = flask.current_app.data.person_create(model_in(flask.request.json["person"]))
+
+    changed("person", person.person_id, "create")
+
+    return {"person": model_out(person)}, 201
+
+def person_list(fields=None, exclude=None, limit=None, after=None):
+
+    return models_list(nandy.store.mysql.Person, "persons", fields, exclude, limit, after)
 
-def person_list():
+def person_bulk_create():
 
-    return {"persons": models_out(flask.current_app.data.person_list())}
+    return models_create(nandy.store.mysql.Person, "person", "persons")
+
+def person_bulk_update():
+
+    return models_update(nandy.store.mysql.Person, "person", "persons")
+
+def person_bulk_delete(person_ids):
+
+    return models_delete(nandy.store.mysql.Person, "person", "persons", person_ids)
 
 def person_retrieve(person_id):
 
-    return {"person": model_out(flask.current_app.data.person_retrieve(person_id))}
+    return retrieved("person", person_id, lambda: flask.current_app.data.person_retrieve(person_id))
 
 def person_update(person_id):
 
-    return {
-        "updated": flask.current_app.data.person_update(
-            person_id,
-            model_in(flask.request.json["person"])
-        )
-    }, 202
+    updated = flask.current_app.data.person_update(person_id, model_in(flask.request.json["person"]))
+
+    changed("person", person_id, "update", updated)
+
+    return {"updated": updated}, 202
 
 def person_delete(person_id):
 
-    return {
-        "deleted": flask.current_app.data.person_delete(person_id)
-    }, 202
+    deleted = flask.current_app.data.person_delete(person_id)
+
+    changed("person", person_id, "delete", deleted)
+
+    return {"deleted": deleted}, 202
 
 def area_create():
 
-    return {
-        "area": model_out(
-            flask.current_app.data.area_create(
-                model_in(flask.request.json["area"])
-            )
-        )
-    }, 201
+    area = flask.current_app.data.area_create(model_in(flask.request.json["area"]))
+
+    changed("area", area.area_id, "create")
+
+    return {"area": model_out(area)}, 201
 
-def area_list():
+def area_list(fields=None, exclude=None, limit=None, after=None):
 
-    return {"areas": models_out(flask.current_app.data.area_list())}
+    return models_list(nandy.store.mysql.Area, "areas", fields, exclude, limit, after)
 
 def area_retrieve(area_id):
 
-    return {"area": model_out(flask.current_app.data.area_retrieve(area_id))}
+    return retrieved("area", area_id, lambda: flask.current_app.data.area_retrieve(area_id))
 
 def area_update(area_id):
 
-    return {
-        "updated": flask.current_app.data.area_update(
-            area_id,
-            model_in(flask.request.json["area"])
-        )
-    }, 202
+    updated = flask.current_app.data.area_update(area_id, model_in(flask.request.json["area"]))
+
+    changed("area", area_id, "update", updated)
+
+    return {"updated": updated}, 202
 
 def area_status(area_id, status):
 
     area = flask.current_app.data.area_retrieve(area_id)
 
-    return {
-        "updated": flask.current_app.data.area_status(
-            area,
-            status
-        )
-    }, 202
+    updated = flask.current_app.data.area_status(area, status)
+
+    changed("area", area.area_id, status, updated)
+    affected(status, updated)
+
+    return {"updated": updated}, 202
 
 def area_delete(area_id):
 
-    return {
-        "deleted": flask.current_app.data.area_delete(area_id)
-    }, 202
+    deleted = flask.current_app.data.area_delete(area_id)
+
+    changed("area", area_id, "delete", deleted)
+
+    return {"deleted": deleted}, 202
 
 def template_create():
 
-    return {
-        "template": model_out(
-            flask.current_app.data.template_create(
-                model_in(flask.request.json["template"])
-            )
-        )
-    }, 201
+    template = flask.current_app.data.template_create(model_in(flask.request.json["template"]))
+
+    changed("template", template.template_id, "create")
+
+    return {"template": model_out(template)}, 201
+
+def template_list(fields=None, exclude=None, limit=None, after=None):
+
+    return models_list(nandy.store.mysql.Template, "templates", fields, exclude, limit, after)
+
+def template_bulk_create():
+
+    return models_create(nandy.store.mysql.Template, "template", "templates")
+
+def template_bulk_update():
+
+    return models_update(nandy.store.mysql.Template, "template", "templates")
 
-def template_list():
+def template_bulk_delete(template_ids):
 
-    return {"templates": models_out(flask.current_app.data.template_list())}
+    return models_delete(nandy.store.mysql.Template, "template", "templates", template_ids)
 
 def template_retrieve(template_id):
 
-    return {"template": model_out(flask.current_app.data.template_retrieve(template_id))}
+    return retrieved("template", template_id, lambda: flask.current_app.data.template_retrieve(template_id))
 
 def template_update(template_id):
 
-    return {
-        "updated": flask.current_app.data.template_update(
-            template_id,
-            model_in(flask.request.json["template"])
-        )
-    }, 202
+    updated = flask.current_app.data.template_update(template_id, model_in(flask.request.json["template"]))
+
+    changed("template", template_id, "update", updated)
+
+    return {"updated": updated}, 202
 
 def template_delete(template_id):
 
-    return {
-        "deleted": flask.current_app.data.template_delete(template_id)
-    }, 202
+    deleted = flask.current_app.data.template_delete(template_id)
+
+    changed("template", template_id, "delete", deleted)
+
+    return {"deleted": deleted}, 202
 
 def chore_create():
 
-    return {
-        "chore": model_out(
-            flask.current_app.data.chore_create(
-                fields=(model_in(flask.request.json["chore"]) if "chore" in flask.request.json else None),
-                template=(model_in(flask.request.json["template"]) if "template" in flask.request.json else None)
-            )
+    chore = flask.current_app.data.chore_create(
+        fields=(model_in(flask.request.json["chore"]) if "chore" in flask.request.json else None),
+        template=(model_in(flask.request.json["template"]) if "template" in flask.request.json else None)
+    )
+
+    changed("chore", chore.chore_id, "create")
+
+    return {"chore": model_out(chore)}, 201
+
+def chore_list(
+    fields=None, exclude=None, limit=None, after=None,
+    person=None, status=None, node=None,
+    created_after=None, created_before=None, updated_after=None, updated_before=None
+):
+
+    return models_list(
+        nandy.store.mysql.Chore, "chores", fields, exclude, limit, after,
+        models_filter(
+            nandy.store.mysql.Chore,
+            person=person,
+            node=node,
+            status=status,
+            created=(created_after, created_before),
+            updated=(updated_after, updated_before)
         )
-    }, 201
+    )
+
+def chore_bulk_update():
 
-def chore_list():
+    return models_update(nandy.store.mysql.Chore, "chore", "chores")
 
-    return {"chores": models_out(flask.current_app.data.chore_list())}
+def chore_bulk_delete(chore_ids):
+
+    return models_delete(nandy.store.mysql.Chore, "chore", "chores", chore_ids)
 
 def chore_retrieve(chore_id):
 
-    return {"chore": model_out(flask.current_app.data.chore_retrieve(chore_id))}
+    return retrieved("chore", chore_id, lambda: flask.current_app.data.chore_retrieve(chore_id))
 
 def chore_update(chore_id):
 
-    return {
-        "updated": flask.current_app.data.chore_update(
-            chore_id,
-            model_in(flask.request.json["chore"])
-        )
-    }, 202
+    updated = flask.current_app.data.chore_update(chore_id, model_in(flask.request.json["chore"]))
+
+    changed("chore", chore_id, "update", updated)
+
+    return {"updated": updated}, 202
+
+# The row is locked just long enough to change it so two taps can't both
+# start from the same tasks and one silently overwrite the other. A client
+# sending If-Match gets a 409 if the chore has moved on from the version it
+# saw, and the new version back otherwise. That comes back as X-Chore-ETag, as
+# what these respond with isn't the chore and so can't carry its ETag. Actions
+# run in models_transaction so the lock's held however often they commit
+
+def chore_tag(chore):
+
+    return {"X-Chore-ETag": f'"{model_tag(chore)}"'}
+
+def chore_lock(chore_id):
+
+    return flask.current_app.data.mysql.session.query(nandy.store.mysql.Chore).filter_by(
+        chore_id=chore_id
+    ).with_for_update().populate_existing().one_or_none()
+
+def chore_conflict(chore):
+
+    tag = model_tag(chore)
+
+    if "If-Match" in flask.request.headers and not flask.request.if_match.contains_weak(tag):
+        return {"message": f"chore {chore.chore_id} has changed"}, 409, chore_tag(chore)
+
+    return None
 
 def chore_action(chore_id, action):
 
-    chore = flask.current_app.data.chore_retrieve(chore_id)
+    if action in CHORE_ACTIONS:
 
-    if action in ["next", "pause", "unpause", "skip", "unskip", "complete", "incomplete"]:
-        return {
-            "updated": getattr(flask.current_app.data, f"chore_{action}")(chore)
-        }, 202
+        session = flask.current_app.data.mysql.session
 
-def chore_delete(chore_id):
+        chore = chore_lock(chore_id)
+
+        if chore is None:
+            session.rollback()
+            return {"message": f"chore {chore_id} not found"}, 404
+
+        conflict = chore_conflict(chore)
+
+        if conflict is not None:
+            session.rollback()
+            return conflict
+
+        with models_transaction(session):
+            updated = getattr(flask.current_app.data, f"chore_{action}")(chore)
+
+        changed("chore", chore.chore_id, action, updated)
+        affected(action, updated)
+
+        return {"updated": updated}, 202, chore_tag(chore)
+
+def chore_actions(chore_id):
+
+    session = flask.current_app.data.mysql.session
+    actions = flask.request.json["actions"]
+
+    chore = chore_lock(chore_id)
+
+    if chore is None:
+        session.rollback()
+        return {"message": f"chore {chore_id} not found"}, 404
+
+    conflict = chore_conflict(chore)
+
+    if conflict is not None:
+        session.rollback()
+        return conflict
+
+    errors = []
+
+    for index, action in enumerate(actions):
+
+        if "task_id" not in action and action["action"] not in CHORE_ACTIONS:
+            errors.append({"index": index, "error": f"unknown chore action {action['action']}"})
+
+        if "task_id" in action and action["action"] not in TASK_ACTIONS:
+            errors.append({"index": index, "error": f"unknown task action {action['action']}"})
+
+        if "task_id" in action and not 0 <= action["task_id"] < len(chore.data.get("tasks", [])):
+            errors.append({"index": index, "error": f"task {action['task_id']} not found"})
+
+    if errors:
+        session.rollback()
+        return {"errors": errors}, 400
+
+    results = []
+
+    with models_transaction(session):
+
+        for action in actions:
+
+            if "task_id" in action:
+                updated = getattr(flask.current_app.data, f"task_{action['action']}")(chore.data["tasks"][action["task_id"]], chore)
+                results.append((f"task_{action['action']}", updated))
+            else:
+                updated = getattr(flask.current_app.data, f"chore_{action['action']}")(chore)
+                results.append((action["action"], updated))
+
+    for name, updated in results:
+        changed("chore", chore.chore_id, name, updated)
+
+    affected("actions", sum(updated for name, updated in results))
 
     return {
-        "deleted": flask.current_app.data.chore_delete(chore_id)
-    }, 202
+        "updated": [updated for name, updated in results],
+        "chore": model_out(chore)
+    }, 202, chore_tag(chore)
+
+def chore_delete(chore_id):
+
+    deleted = flask.current_app.data.chore_delete(chore_id)
+
+    changed("chore", chore_id, "delete", deleted)
+
+    return {"deleted": deleted}, 202
 
 def task_action(chore_id, task_id, action):
 
-    chore = flask.current_app.data.chore_retrieve(chore_id)
+    if action in TASK_ACTIONS:
+
+        session = flask.current_app.data.mysql.session
+
+        chore = chore_lock(chore_id)
+
+        if chore is None or not 0 <= task_id < len(chore.data.get("tasks", [])):
+            session.rollback()
+            return {"message": f"chore {chore_id} task {task_id} not found"}, 404
+
+        conflict = chore_conflict(chore)
+
+        if conflict is not None:
+            session.rollback()
+            return conflict
+
+        with models_transaction(session):
+            updated = getattr(flask.current_app.data, f"task_{action}")(chore.data["tasks"][task_id], chore)
+
+        changed("chore", chore.chore_id, f"task_{action}", updated)
+        affected(f"task_{action}", updated)
 
-    if action in ["pause", "unpause", "skip", "unskip", "complete", "incomplete"]:
-        return {
-            "updated": getattr(flask.current_app.data, f"task_{action}")(chore.data["tasks"][task_id], chore)
-        }, 202
+        return {"updated": updated}, 202, chore_tag(chore)
 
 def act_create():
 
-    return {
-        "act": model_out(
-            flask.current_app.data.act_create(
-                fields=(model_in(flask.request.json["act"]) if "act" in flask.request.json else None),
-                template=(model_in(flask.request.json["template"]) if "template" in flask.request.json else None)
-            )
+    act = flask.current_app.data.act_create(
+        fields=(model_in(flask.request.json["act"]) if "act" in flask.request.json else None),
+        template=(model_in(flask.request.json["template"]) if "template" in flask.request.json else None)
+    )
+
+    changed("act", act.act_id, "create")
+
+    return {"act": model_out(act)}, 201
+
+def act_list(
+    fields=None, exclude=None, limit=None, after=None,
+    person=None, value=None, created_after=None, created_before=None
+):
+
+    return models_list(
+        nandy.store.mysql.Act, "acts", fields, exclude, limit, after,
+        models_filter(
+            nandy.store.mysql.Act,
+            person=person,
+            value=value,
+            created=(created_after, created_before)
         )
-    }, 201
+    )
+
+def act_bulk_update():
+
+    return models_update(nandy.store.mysql.Act, "act", "acts")
 
-def act_list():
+def act_bulk_delete(act_ids):
 
-    return {"acts": models_out(flask.current_app.data.act_list())}
+    return models_delete(nandy.store.mysql.Act, "act", "acts", act_ids)
 
 def act_retrieve(act_id):
 
-    return {"act": model_out(flask.current_app.data.act_retrieve(act_id))}
+    return retrieved("act", act_id, lambda: flask.current_app.data.act_retrieve(act_id))
 
 def act_update(act_id):
 
-    return {
-        "updated": flask.current_app.data.act_update(
-            act_id,
-            model_in(flask.request.json["act"])
-        )
-    }, 202
+    updated = flask.current_app.data.act_update(act_id, model_in(flask.request.json["act"]))
+
+    changed("act", act_id, "update", updated)
+
+    return {"updated": updated}, 202
 
 def act_delete(act_id):
 
-    return {
-        "deleted": flask.current_app.data.act_delete(act_id)
-    }, 202
+    deleted = flask.current_app.data.act_delete(act_id)
+
+    changed("act", act_id, "delete", deleted)
+
+    return {"deleted": deleted}, 202
@@ -0,0 +1,56 @@
+import os
+import json
+import hashlib
+
+import yaml
+
+# Parsing the OpenAPI YAML with PyYAML takes seconds on a Pi, so the build
+# writes the parsed spec out as JSON next to it, stamped with the hash of the
+# YAML it came from. If the YAML has drifted since, the stamp won't match and
+# the YAML gets parsed as usual
+
+def digest(text):
+
+    return hashlib.sha256(text).hexdigest()
+
+def paths(directory, name):
+
+    base = os.path.join(directory, name)
+
+    return f"{base}.yaml", f"{base}.json"
+
+def parse(text):
+
+    return yaml.load(text, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+def compile(directory, name="service"):
+
+    source, compiled = paths(directory, name)
+
+    with open(source, "rb") as source_file:
+        text = source_file.read()
+
+    with open(compiled, "w") as compiled_file:
+        json.dump({"sha256": digest(text), "spec": parse(text)}, compiled_file)
+
+    return compiled
+
+def load(directory, name="service"):
+
+    source, compiled = paths(directory, name)
+
+    with open(source, "rb") as source_file:
+        text = source_file.read()
+
+    try:
+
+        with open(compiled, "r") as compiled_file:
+            cached = json.load(compiled_file)
+
+        if cached["sha256"] == digest(text):
+            return cached["spec"]
+
+    except (OSError, ValueError, KeyError):
+        pass
+
+    return parse(text)
@@ -6,4 +6,5 @@ until nc -zw3 mysql 3306; do
 done
 
 nandy-data/mysql/load.py
+bin/index.py
 bin/api.py
\ No newline at end of file
@@ -0,0 +1,233 @@
+import unittest
+import unittest.mock
+
+import json
+import asyncio
+
+import asgi
+import service
+
+class MockApp(object):
+
+    def __init__(self, chunks):
+
+        self.chunks = chunks
+        self.environ = None
+
+        self.data = unittest.mock.MagicMock()
+        self.metrics = unittest.mock.MagicMock()
+
+    def __call__(self, environ, start_response):
+
+        self.environ = environ
+
+        start_response("201 CREATED", [("Content-Type", "text/plain")])
+
+        return iter(self.chunks)
+
+def run(coroutine):
+
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+def call(app, scope, messages):
+
+    sent = []
+
+    async def receive():
+
+        if messages:
+            return messages.pop(0)
+
+        await asyncio.sleep(10)
+
+    async def send(message):
+        sent.append(message)
+
+    run(app(scope, receive, send))
+
+    return sent
+
+def scope(path, method="GET", query=b"", headers=None):
+
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query,
+        "headers": headers or [],
+        "server": ("unit", 7865),
+        "client": ("test", 1234)
+    }
+
+@unittest.mock.patch("asgi.Events.start", unittest.mock.MagicMock())
+class TestEvents(unittest.TestCase):
+
+    def test_publish(self):
+
+        events = asgi.Events(None, "unit")
+
+        async def publish():
+
+            queue = events.subscribe()
+            events.publish("a")
+
+            return await queue[1].get()
+
+        self.assertEqual(run(publish()), "a")
+
+    def test_unsubscribe(self):
+
+        events = asgi.Events(None, "unit")
+
+        async def subscribe():
+            return events.subscribe()
+
+        queue = run(subscribe())
+        events.unsubscribe(queue)
+
+        self.assertEqual(events.queues, set())
+
+@unittest.mock.patch("asgi.Events.start", unittest.mock.MagicMock())
+class TestApp(unittest.TestCase):
+
+    def test_environ(self):
+
+        environ = asgi.App.environ(scope("/area", "POST", b"a=1", [
+            (b"content-type", b"application/json"),
+            (b"accept", b"text/plain"),
+            (b"accept", b"application/json")
+        ]), b"{}")
+
+        self.assertEqual(environ["REQUEST_METHOD"], "POST")
+        self.assertEqual(environ["PATH_INFO"], "/area")
+        self.assertEqual(environ["QUERY_STRING"], "a=1")
+        self.assertEqual(environ["SERVER_PORT"], "7865")
+        self.assertEqual(environ["REMOTE_ADDR"], "test")
+        self.assertEqual(environ["CONTENT_TYPE"], "application/json")
+        self.assertEqual(environ["HTTP_ACCEPT"], "text/plain,application/json")
+        self.assertEqual(environ["wsgi.input"].read(), b"{}")
+
+    def test_wsgi(self):
+
+        app = MockApp([b"a", b"", b"b"])
+
+        sent = call(asgi.App(app), scope("/area", "POST"), [
+            {"type": "http.request", "body": b"{", "more_body": True},
+            {"type": "http.request", "body": b"}"}
+        ])
+
+        self.assertEqual(app.environ["wsgi.input"].read(), b"{}")
+        self.assertEqual(sent, [
+            {"type": "http.response.start", "status": 201, "headers": [(b"content-type", b"text/plain")]},
+            {"type": "http.response.body", "body": b"a", "more_body": True},
+            {"type": "http.response.body", "body": b"b", "more_body": True},
+            {"type": "http.response.body", "body": b"", "more_body": False}
+        ])
+
+    @unittest.mock.patch("asgi.ASGI_CHUNKS", 1)
+    def test_wsgi_bounded(self):
+
+        app = MockApp([b"a", b"b", b"c", b"d"])
+
+        sent = call(asgi.App(app), scope("/area"), [{"type": "http.request"}])
+
+        self.assertEqual([message["body"] for message in sent[1:]], [b"a", b"b", b"c", b"d", b""])
+
+        # A client gone mid response frees the thread rather than stranding it
+
+        app = MockApp([b"a", b"b", b"c", b"d"])
+        instance = asgi.App(app)
+
+        async def send(message):
+            if message.get("body"):
+                raise IOError("gone")
+
+        async def receive():
+            return {"type": "http.request"}
+
+        with self.assertRaises(IOError):
+            run(instance(scope("/area"), receive, send))
+
+        instance.pool.shutdown(wait=True)
+
+    def test_lifespan(self):
+
+        app = asgi.App(MockApp([]))
+
+        self.assertEqual(call(app, {"type": "lifespan"}, [
+            {"type": "lifespan.startup"},
+            {"type": "lifespan.shutdown"}
+        ]), [
+            {"type": "lifespan.startup.complete"},
+            {"type": "lifespan.shutdown.complete"}
+        ])
+
+    def test_event_poll(self):
+
+        app = asgi.App(MockApp([]))
+
+        original = app.events.subscribe
+
+        def subscribe():
+            queue = original()
+            app.events.publish(json.dumps({"id": 1}))
+            app.events.publish(json.dumps({"id": 2}))
+            return queue
+
+        with unittest.mock.patch.object(app.events, "subscribe", subscribe):
+            sent = call(app, scope("/event", query=b"timeout=1"), [{"type": "http.request"}])
+
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(json.loads(sent[1]["body"]), {"events": [{"id": 1}, {"id": 2}]})
+        self.assertEqual(app.events.queues, set())
+        app.app.metrics.record.assert_called_once_with("service_event_stream", 200, unittest.mock.ANY)
+
+        self.assertEqual(json.loads(call(app, scope("/event", query=b"timeout=0"), [])[1]["body"]), {"events": []})
+        self.assertEqual(call(app, scope("/event", query=b"timeout=nope"), [])[0]["status"], 400)
+
+    @unittest.mock.patch("asgi.time.time")
+    def test_event_timeout(self, mock_time):
+
+        mock_time.return_value = 0
+
+        app = asgi.App(MockApp([]))
+        deadlines = []
+
+        async def poll(send, queue, deadline):
+            deadlines.append(deadline)
+
+        with unittest.mock.patch.object(app, "poll", poll):
+            call(app, scope("/event", query=b"timeout=-5"), [])
+            call(app, scope("/event", query=b"timeout=100000"), [])
+            call(app, scope("/event", query=b"timeout=5"), [])
+
+        self.assertEqual(deadlines, [0, 300, 5])
+
+    def test_event_stream(self):
+
+        app = asgi.App(MockApp([]))
+
+        original = app.events.subscribe
+
+        def subscribe():
+            queue = original()
+            app.events.publish(json.dumps({"id": 1}))
+            return queue
+
+        with unittest.mock.patch.object(app.events, "subscribe", subscribe):
+            sent = call(app, scope("/event", query=b"timeout=1", headers=[(b"accept", b"text/event-stream")]), [])
+
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream; charset=utf-8"), sent[0]["headers"])
+        self.assertEqual(sent[1]["body"], f"retry: {service.EVENT_RETRY}\n\n".encode())
+        self.assertEqual(sent[2]["body"], b'data: {"id": 1}\n\n')
+        self.assertEqual(sent[-1], {"type": "http.response.body", "body": b"", "more_body": False})
+
+        # Gone clients stop being streamed to
+
+        sent = call(app, scope("/event", query=b"timeout=5", headers=[(b"accept", b"text/event-stream")]), [
+            {"type": "http.request"},
+            {"type": "http.disconnect"}
+        ])
+
+        self.assertLess(len(sent), 5)
@@ -0,0 +1,306 @@
+import unittest
+import unittest.mock
+
+import cache
+
+class TestLRU(unittest.TestCase):
+
+    def test___init__(self):
+
+        lru = cache.LRU(2)
+
+        self.assertEqual(lru.size, 2)
+        self.assertEqual(len(lru), 0)
+
+    def test_get(self):
+
+        lru = cache.LRU(2)
+        lru.set("a", 1)
+
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("b", 2), 2)
+
+        self.assertEqual(lru.hits, 1)
+        self.assertEqual(lru.misses, 2)
+
+    def test_set(self):
+
+        lru = cache.LRU(2)
+
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("c"), 3)
+        self.assertEqual(lru.evictions, 1)
+
+    @unittest.mock.patch("cache.time.time")
+    def test_get_ttl(self, mock_time):
+
+        lru = cache.LRU(2, ttl=5)
+
+        mock_time.return_value = 10
+        lru.set("a", 1)
+
+        mock_time.return_value = 15
+        self.assertEqual(lru.get("a"), 1)
+
+        mock_time.return_value = 16
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 0)
+
+    def test_delete(self):
+
+        lru = cache.LRU(2)
+        lru.set("a", 1)
+        lru.delete("a")
+        lru.delete("b")
+
+        self.assertEqual(len(lru), 0)
+
+    def test_purge(self):
+
+        lru = cache.LRU(3)
+        lru.set(("a", 1), 1)
+        lru.set(("a", 2), 2)
+        lru.set(("b", 1), 3)
+        lru.purge(lambda key: key[0] == "a")
+
+        self.assertEqual(len(lru), 1)
+        self.assertEqual(lru.get(("b", 1)), 3)
+
+    def test_clear(self):
+
+        lru = cache.LRU(2)
+        lru.set("a", 1)
+        lru.clear()
+
+        self.assertEqual(len(lru), 0)
+
+    def test_stats(self):
+
+        lru = cache.LRU(1)
+
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("b")
+        lru.get("a")
+
+        self.assertEqual(lru.stats(), {
+            "size": 1,
+            "max": 1,
+            "hits": 1,
+            "misses": 1,
+            "evictions": 1
+        })
+
+class MockClient(object):
+
+    def __init__(self):
+
+        self.values = {}
+
+    def get(self, key):
+
+        return self.values.get(key)
+
+    def mget(self, keys):
+
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+
+        if nx and key in self.values:
+            return None
+
+        self.values[key] = value
+
+        return True
+
+    def incr(self, key):
+
+        self.values[key] = int(self.values.get(key, 0)) + 1
+
+        return self.values[key]
+
+    def eval(self, script, count, key, token):
+
+        if self.values.get(key) == token:
+            del self.values[key]
+
+class TestRedis(unittest.TestCase):
+
+    def test_key(self):
+
+        self.assertEqual(cache.Redis(MockClient(), "a").key("b", 1), "a/b/1")
+
+    def test_get(self):
+
+        client = MockClient()
+        remote = cache.Redis(client, "a")
+
+        client.values["b"] = "c"
+
+        self.assertEqual(remote.get("b"), b"c")
+        self.assertIsNone(remote.get("d"))
+
+        client.get = unittest.mock.MagicMock(side_effect=Exception("down"))
+
+        self.assertIsNone(remote.get("b"))
+        self.assertEqual(remote.counts, {"hits": 1, "misses": 1, "errors": 1})
+
+    def test_set(self):
+
+        client = unittest.mock.MagicMock()
+
+        cache.Redis(client, "a", ttl=5).set("b", b"c")
+
+        client.set.assert_called_once_with("b", b"c", ex=5)
+
+    def test_versioned(self):
+
+        client = MockClient()
+        remote = cache.Redis(client, "a")
+
+        self.assertEqual(remote.versioned("b", 1), "a/b/1/0.0")
+
+        client.values["a/b/1/version"] = b"f"
+
+        self.assertEqual(remote.versioned("b", 1), "a/b/1/0.f")
+
+        client.values["a/b/version"] = "e"
+
+        self.assertEqual(remote.versioned("b", 1), "a/b/1/e.f")
+        self.assertEqual(remote.versioned("b", 2), "a/b/2/e.0")
+
+        client.mget = unittest.mock.MagicMock(side_effect=Exception("down"))
+
+        self.assertIsNone(remote.versioned("b", 1))
+
+        remote.ttl = 0
+        client.mget.reset_mock()
+
+        self.assertIsNone(remote.versioned("b", 1))
+        client.mget.assert_not_called()
+
+    def test_bump(self):
+
+        client = unittest.mock.MagicMock()
+        remote = cache.Redis(client, "a", ttl=5)
+
+        remote.bump("b", 1)
+        remote.bump("b", 1)
+
+        first, second = client.set.call_args_list
+
+        self.assertEqual(first[0][0], "a/b/1/version")
+        self.assertNotEqual(first[0][1], second[0][1])
+        self.assertEqual(first[1], {"ex": 10})
+
+        client = MockClient()
+        remote = cache.Redis(client, "a")
+
+        key = remote.versioned("b", 1)
+        remote.bump("b", 1)
+        self.assertNotEqual(remote.versioned("b", 1), key)
+
+        # The whole kind at once
+
+        keys = [remote.versioned("b", 1), remote.versioned("b", 2)]
+        remote.bump("b")
+        self.assertEqual([key == remote.versioned("b", id) for key, id in zip(keys, [1, 2])], [False, False])
+
+        client.set = unittest.mock.MagicMock(side_effect=Exception("down"))
+        remote.bump("b", 1)
+
+        self.assertEqual(remote.counts["errors"], 1)
+
+        remote.ttl = 0
+        client.set.reset_mock()
+        remote.bump("b", 1)
+
+        client.set.assert_not_called()
+
+    def test_release(self):
+
+        client = MockClient()
+        remote = cache.Redis(client, "a")
+
+        client.values["b/lock"] = "theirs"
+        remote.release("b/lock", "ours")
+        self.assertEqual(client.values, {"b/lock": "theirs"})
+
+        remote.release("b/lock", "theirs")
+        self.assertEqual(client.values, {})
+
+    def test_fetch(self):
+
+        client = MockClient()
+        remote = cache.Redis(client, "a")
+        load = unittest.mock.MagicMock(return_value=b"c")
+
+        self.assertEqual(remote.fetch("b", load), b"c")
+        self.assertEqual(remote.fetch("b", load), b"c")
+        load.assert_called_once_with()
+        self.assertEqual(client.values, {"b": b"c"})
+
+        # A stale load lands under a version nobody reads any more
+
+        key = remote.versioned("g", 1)
+        remote.bump("g", 1)
+        remote.fetch(key, load)
+
+        self.assertNotEqual(remote.versioned("g", 1), key)
+        self.assertIsNone(client.get(remote.versioned("g", 1)))
+        self.assertEqual(remote.fetch(None, load), b"c")
+
+        # Someone else is loading, so wait for their value
+
+        client.values["d/lock"] = 1
+        client.get = unittest.mock.MagicMock(side_effect=[None, None, b"e"])
+
+        self.assertEqual(remote.fetch("d", load), b"e")
+        self.assertEqual(remote.counts["waits"], 2)
+
+        # They've taken too long, load it anyway
+
+        client.get = unittest.mock.MagicMock(return_value=None)
+        remote.lock = 0
+
+        self.assertEqual(remote.fetch("d", load), b"c")
+
+        # Down or disabled, just load
+
+        client.set = unittest.mock.MagicMock(side_effect=Exception("down"))
+
+        self.assertEqual(remote.fetch("f", load), b"c")
+
+        remote.ttl = 0
+        client.get.reset_mock()
+
+        self.assertEqual(remote.fetch("f", load), b"c")
+        client.get.assert_not_called()
+
+    def test_stats(self):
+
+        client = MockClient()
+        remote = cache.Redis(client, "a", ttl=5)
+
+        client.values["b"] = b"c"
+        remote.get("b")
+        remote.get("b")
+        remote.get("b")
+        remote.get("d")
+
+        self.assertEqual(remote.stats(), {
+            "ttl": 5,
+            "hits": 3,
+            "misses": 1,
+            "waits": 0,
+            "errors": 0,
+            "ratio": 0.75
+        })
@@ -0,0 +1,227 @@
+import unittest
+import unittest.mock
+
+import gzip
+
+import compress
+
+def app(status="200 OK", headers=None, body=None):
+
+    def wsgi(environ, start_response):
+        start_response(status, headers if headers is not None else [("Content-Type", "application/json")])
+        return body if body is not None else [b'{"a": 1}' * 100]
+
+    return wsgi
+
+def call(middleware, encoding=None, path="/", method="GET"):
+
+    environ = {"REQUEST_METHOD": method, "PATH_INFO": path, "QUERY_STRING": ""}
+
+    if encoding is not None:
+        environ["HTTP_ACCEPT_ENCODING"] = encoding
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = status
+        started["headers"] = dict(headers)
+
+    body = b"".join(middleware(environ, start_response))
+
+    return started["status"], started["headers"], body
+
+class TestCompress(unittest.TestCase):
+
+    def test_accepted(self):
+
+        self.assertEqual(compress.accepted("gzip, br;q=0.5, deflate;q=nope, , identity;q=0"), {
+            "gzip": 1.0,
+            "br": 0.5,
+            "deflate": 0.0,
+            "identity": 0.0
+        })
+
+    def test_negotiate(self):
+
+        with unittest.mock.patch("compress.brotli", None):
+            self.assertEqual(compress.negotiate("gzip, br"), "gzip")
+            self.assertEqual(compress.negotiate("*"), "gzip")
+            self.assertIsNone(compress.negotiate("gzip;q=0"))
+            self.assertIsNone(compress.negotiate(""))
+
+        with unittest.mock.patch("compress.brotli", unittest.mock.MagicMock()):
+            self.assertEqual(compress.negotiate("gzip, br"), "br")
+            self.assertEqual(compress.negotiate("gzip"), "gzip")
+
+    def test_Compressor(self):
+
+        compressor = compress.Compressor("gzip", 6)
+
+        self.assertEqual(gzip.decompress(compressor.compress(b"unit") + compressor.flush()), b"unit")
+
+        with unittest.mock.patch("compress.brotli") as mock_brotli:
+
+            compressor = compress.Compressor("br", 20)
+            mock_brotli.Compressor.assert_called_once_with(quality=11)
+
+            compressor.compress(b"unit")
+            mock_brotli.Compressor.return_value.process.assert_called_once_with(b"unit")
+
+            compressor.flush()
+            mock_brotli.Compressor.return_value.finish.assert_called_once_with()
+
+    def test___init__(self):
+
+        middleware = compress.Compress("app", 1, 2, 3)
+
+        self.assertEqual(middleware.app, "app")
+        self.assertEqual(middleware.minimum, 1)
+        self.assertEqual(middleware.level, 2)
+        self.assertEqual(middleware.cache.size, 3)
+
+    def test_header(self):
+
+        self.assertEqual(compress.Compress.header([("Content-Type", "a")], "content-type"), "a")
+        self.assertIsNone(compress.Compress.header([], "content-type"))
+
+    def test_compressible(self):
+
+        middleware = compress.Compress(None, minimum=10)
+
+        self.assertTrue(middleware.compressible("200 OK", [("Content-Type", "application/json; charset=utf-8")]))
+        self.assertTrue(middleware.compressible("200 OK", [("Content-Type", "application/json"), ("Content-Length", "10")]))
+        self.assertFalse(middleware.compressible("200 OK", [("Content-Type", "application/json"), ("Content-Length", "9")]))
+        self.assertFalse(compress.Compress(None, minimum=0).compressible("200 OK", [("Content-Type", "application/json"), ("Content-Length", "0")]))
+        self.assertFalse(middleware.compressible("304 Not Modified", [("Content-Type", "application/json")]))
+        self.assertFalse(middleware.compressible("204 No Content", [("Content-Type", "application/json")]))
+        self.assertFalse(middleware.compressible("200 OK", [("Content-Type", "text/event-stream")]))
+        self.assertFalse(middleware.compressible("200 OK", [("Content-Type", "application/json"), ("Content-Encoding", "gzip")]))
+
+    def test_negotiable(self):
+
+        middleware = compress.Compress(None)
+
+        self.assertTrue(middleware.negotiable("200 OK", [("Content-Type", "application/json"), ("Content-Length", "1")]))
+        self.assertFalse(middleware.negotiable("304 Not Modified", [("Content-Type", "application/json")]))
+        self.assertFalse(middleware.negotiable("200 OK", [("Content-Type", "text/event-stream")]))
+
+    def test_varied(self):
+
+        self.assertEqual(compress.Compress.varied([("A", "b")]), [("A", "b"), ("Vary", "Accept-Encoding")])
+        self.assertEqual(compress.Compress.varied([("Vary", "Accept")]), [("Vary", "Accept, Accept-Encoding")])
+        self.assertEqual(compress.Compress.varied([("Vary", "accept-encoding")]), [("Vary", "accept-encoding")])
+
+    def test_compress(self):
+
+        middleware = compress.Compress(None)
+
+        compressed = middleware.compress("gzip", b"unit", '"a"', ("/a", ""))
+
+        self.assertEqual(gzip.decompress(compressed), b"unit")
+        self.assertIs(middleware.compress("gzip", b"test", '"a"', ("/a", "")), compressed)
+        self.assertEqual(gzip.decompress(middleware.compress("gzip", b"test", '"a"', ("/b", ""))), b"test")
+        self.assertEqual(gzip.decompress(middleware.compress("gzip", b"test")), b"test")
+
+    def test_stream(self):
+
+        middleware = compress.Compress(None)
+        iterable = unittest.mock.MagicMock()
+        iterable.__iter__.return_value = iter([b"unit", b"test"])
+
+        self.assertEqual(gzip.decompress(b"".join(middleware.stream("gzip", iterable))), b"unittest")
+        iterable.close.assert_called_once_with()
+
+    @unittest.mock.patch("compress.brotli", None)
+    def test___call__(self):
+
+        body = b'{"a": 1}' * 100
+
+        status, headers, compressed = call(compress.Compress(app()))
+        self.assertEqual(compressed, body)
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(headers["Vary"], "Accept-Encoding")
+
+        status, headers, compressed = call(compress.Compress(app()), "gzip")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(headers["Vary"], "Accept-Encoding")
+        self.assertNotIn("Content-Length", headers)
+        self.assertEqual(gzip.decompress(compressed), body)
+
+        status, headers, compressed = call(compress.Compress(app(headers=[
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+            ("ETag", '"a"')
+        ])), "gzip")
+        self.assertEqual(headers["Content-Length"], str(len(compressed)))
+        self.assertEqual(headers["ETag"], 'W/"a"')
+        self.assertEqual(gzip.decompress(compressed), body)
+
+        status, headers, compressed = call(compress.Compress(app(headers=[
+            ("Content-Type", "application/json"),
+            ("Content-Length", "8")
+        ], body=[b'{"a": 1}'])), "gzip")
+        self.assertEqual(compressed, b'{"a": 1}')
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(headers["Vary"], "Accept-Encoding")
+
+        status, headers, compressed = call(compress.Compress(app(headers=[("Content-Type", "text/event-stream")])), "gzip")
+        self.assertNotIn("Vary", headers)
+
+    @unittest.mock.patch("compress.brotli", None)
+    def test___call___vary(self):
+
+        # Whatever the app already varies on is kept, compressed or not
+
+        body = b'{"a": 1}' * 100
+
+        for encoding in [None, "gzip"]:
+
+            status, headers, compressed = call(compress.Compress(app(headers=[
+                ("Content-Type", "application/json"),
+                ("Content-Length", str(len(body))),
+                ("Vary", "Origin")
+            ])), encoding)
+
+            self.assertEqual(headers["Vary"], "Origin, Accept-Encoding")
+
+    @unittest.mock.patch("compress.brotli", None)
+    def test___call___empty(self):
+
+        body = b'{"a": 1}' * 100
+
+        # HEAD declares the length of a body it doesn't send
+
+        status, headers, compressed = call(compress.Compress(app(headers=[
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body)))
+        ], body=[])), "gzip", method="HEAD")
+
+        self.assertEqual(compressed, b"")
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(headers["Content-Length"], str(len(body)))
+        self.assertEqual(headers["Vary"], "Accept-Encoding")
+
+        # A body that turns out empty is sent as it is
+
+        status, headers, compressed = call(compress.Compress(app(headers=[
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body)))
+        ], body=[])), "gzip")
+
+        self.assertEqual(compressed, b"")
+        self.assertNotIn("Content-Encoding", headers)
+
+    @unittest.mock.patch("compress.brotli", None)
+    def test___call___same_etag(self):
+
+        middleware = compress.Compress(None)
+
+        for path, body in [("/chore/1/actions", b'{"updated": [1]}' * 100), ("/chore/1", b'{"chore": {}}' * 100)]:
+
+            middleware.app = app(headers=[
+                ("Content-Type", "application/json"),
+                ("Content-Length", str(len(body))),
+                ("ETag", '"T"')
+            ], body=[body])
+
+            self.assertEqual(gzip.decompress(call(middleware, "gzip", path)[2]), body)
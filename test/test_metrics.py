@@ -0,0 +1,112 @@
+import unittest
+import unittest.mock
+
+import metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def test_percentile(self):
+
+        self.assertEqual(metrics.percentile([], 50), 0.0)
+        self.assertEqual(metrics.percentile([3, 1, 2], 50), 2)
+        self.assertEqual(metrics.percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(metrics.percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(metrics.percentile([1], 99), 1)
+
+    def test___init__(self):
+
+        sender = unittest.mock.MagicMock()
+        instance = metrics.Metrics(sender, interval=5, samples=2)
+
+        self.assertEqual(instance.sender, sender)
+        self.assertEqual(instance.interval, 5)
+        self.assertEqual(instance.samples, 2)
+        self.assertEqual(instance.operations, {})
+
+    def test_record(self):
+
+        instance = metrics.Metrics(samples=2)
+
+        instance.record("unit", 200, 1.0, {"data": 0.5})
+        instance.record("unit", 404, 2.0)
+        instance.record("unit", 200, 3.0, {"data": 0.5, "serialize": 0.25})
+
+        self.assertEqual(instance.operations["unit"]["count"], 3)
+        self.assertEqual(instance.operations["unit"]["statuses"], {200: 2, 404: 1})
+        self.assertEqual(instance.operations["unit"]["latencies"], [1.0, 2.0])
+        self.assertEqual(instance.operations["unit"]["timings"], {"data": 1.0, "serialize": 0.25})
+
+    def test_count(self):
+
+        instance = metrics.Metrics()
+
+        instance.count("unit")
+        instance.count("unit", 2)
+
+        self.assertEqual(instance.counters["unit"], 3)
+
+    def test_gauge(self):
+
+        instance = metrics.Metrics()
+
+        instance.gauge("unit", lambda: 1)
+
+        self.assertEqual(instance.gauges["unit"](), 1)
+
+    def test_collect(self):
+
+        instance = metrics.Metrics()
+
+        instance.record("unit", 200, 1.0, {"data": 0.5})
+        instance.record("unit", 500, 3.0, {"data": 0.5})
+        instance.count("hits", 4)
+        instance.gauge("size", lambda: 7)
+        instance.gauge("broken", lambda: 1 / 0)
+
+        self.assertEqual(instance.collect(), [
+            ("unit.count", 2),
+            ("unit.status.200", 1),
+            ("unit.status.500", 1),
+            ("unit.latency.p50", 1.0),
+            ("unit.latency.p95", 3.0),
+            ("unit.latency.p99", 3.0),
+            ("unit.data", 0.5),
+            ("hits", 4),
+            ("size", 7)
+        ])
+
+        self.assertEqual(instance.collect(), [("size", 7)])
+
+    @unittest.mock.patch("metrics.time.time")
+    def test_flush(self, mock_time):
+
+        mock_time.return_value = 7
+
+        metrics.Metrics().flush()
+
+        sender = unittest.mock.MagicMock()
+        sender.build_message.side_effect = lambda name, value, timestamp: f"{name} {value} {timestamp}\n".encode()
+
+        instance = metrics.Metrics(sender)
+        instance.count("hits")
+        instance.count("misses", 2)
+        instance.flush()
+
+        sender.send_message.assert_called_once_with(b"hits 1 7\nmisses 2 7\n")
+        sender.send.assert_not_called()
+
+        sender.reset_mock()
+        instance.flush()
+
+        sender.send_message.assert_not_called()
+
+    @unittest.mock.patch("metrics.threading.Thread")
+    def test_start(self, mock_thread):
+
+        instance = metrics.Metrics()
+
+        instance.start()
+        instance.start()
+
+        mock_thread.assert_called_once_with(target=instance.run, daemon=True)
+        mock_thread.return_value.start.assert_called_once_with()
@@ -0,0 +1,70 @@
+import unittest
+import unittest.mock
+
+import os
+import time
+import tempfile
+import threading
+
+import sampler
+
+class TestSampler(unittest.TestCase):
+
+    def test___init__(self):
+
+        instance = sampler.Sampler()
+
+        self.assertEqual(instance.thread_id, threading.get_ident())
+        self.assertEqual(instance.interval, 0.001)
+
+        self.assertEqual(sampler.Sampler(7, 0.5).thread_id, 7)
+
+    def test_frame(self):
+
+        frame = unittest.mock.MagicMock()
+        frame.f_code.co_filename = "/opt/pi-k8s/lib/service.py"
+        frame.f_code.co_name = "chore_list"
+
+        self.assertEqual(sampler.Sampler.frame(frame), "service.py:chore_list")
+
+    def test_sample(self):
+
+        instance = sampler.Sampler()
+
+        instance.sample()
+
+        stack = list(instance.stacks.keys())[0]
+        self.assertTrue(stack.endswith("test_sampler.py:test_sample;sampler.py:sample"))
+
+        sampler.Sampler(-1).sample()
+
+    def test_start(self):
+
+        instance = sampler.Sampler()
+
+        instance.start()
+        time.sleep(0.05)
+        stacks = instance.stop()
+
+        self.assertIsNone(instance.thread)
+        self.assertTrue(any("test_sampler.py:test_start" in stack for stack in stacks))
+
+    def test_collapsed(self):
+
+        instance = sampler.Sampler()
+        instance.stacks.update({"a;b": 2, "a": 1})
+
+        self.assertEqual(instance.collapsed(), "a 1\na;b 2\n")
+
+    def test_write(self):
+
+        instance = sampler.Sampler()
+        instance.stacks.update({"a;b": 2})
+
+        with tempfile.TemporaryDirectory() as directory:
+
+            path = os.path.join(directory, "unit.collapsed")
+            instance.write(path)
+
+            with open(path, "r") as collapsed_file:
+                self.assertEqual(collapsed_file.read(), "a;b 2\n")
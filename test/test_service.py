@@ -3,13 +3,23 @@ import unittest.mock
 
 import os
 import copy
+import gzip
+import time
+import flask
+import decimal
+import datetime
 import json
 import yaml
+import tempfile
+import threading
+import sqlalchemy.orm
 
+import nandy.data
 import nandy.store.graphite
 import nandy.store.redis
 import nandy.store.mysql
 
+import cache
 import service
 
 class TestService(unittest.TestCase):
@@ -57,6 +67,177 @@ class TestService(unittest.TestCase):
             for field in model:
                 self.assertEqual(response.json[key][index][field], model[field])
 
+    def test_yaml_backend(self):
+
+        self.assertIn(service.YAML_BACKEND, ["libyaml", "python"])
+
+        self.assertEqual(
+            yaml.dump(service.YAML_PROBE, Dumper=service.YAML_DUMPER, default_flow_style=False),
+            yaml.dump(service.YAML_PROBE, default_flow_style=False)
+        )
+
+    def test_request_operation(self):
+
+        with self.app.app.test_request_context("/nope"):
+            self.assertEqual(service.request_operation(), "unmatched")
+
+    def test_request_record(self):
+
+        self.app.app.metrics.collect()
+
+        self.api.get("/health")
+
+        self.assertEqual(self.app.app.metrics.operations["service_health"]["count"], 1)
+        self.assertEqual(self.app.app.metrics.operations["service_health"]["statuses"], {200: 1})
+
+    def test_query_record(self):
+
+        with self.app.app.test_request_context("/area"):
+
+            service.request_start()
+            self.data.mysql.session.query(nandy.store.mysql.Area).all()
+
+            self.assertGreater(flask.g.timings["data"], 0)
+
+    @unittest.mock.patch("graphyte.Sender", nandy.store.graphite.MockGraphyteSender)
+    @unittest.mock.patch("redis.StrictRedis", nandy.store.redis.MockRedis)
+    def test_mysql_pool(self):
+
+        self.assertIsInstance(self.data.mysql.engine.pool, service.Pool)
+        self.assertEqual(self.data.mysql.engine.pool.size(), service.MYSQL_POOL_SIZE)
+        self.assertIsInstance(self.data.mysql.session, sqlalchemy.orm.scoped_session)
+
+        with self.app.app.test_request_context("/area"):
+
+            service.request_start()
+            self.data.mysql.session.query(nandy.store.mysql.Area).all()
+
+            self.assertIn("pool", flask.g.timings)
+
+        sessions = []
+
+        def query():
+            sessions.append(self.data.mysql.session())
+            self.data.mysql.session.remove()
+
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(sessions[0], self.data.mysql.session())
+
+        # Whatever NandyData set the engine and session up with carries over
+
+        original = nandy.data.NandyData()
+
+        self.assertEqual(self.data.mysql.engine.url, original.mysql.engine.url)
+        self.assertEqual(self.data.mysql.engine.dialect.name, original.mysql.engine.dialect.name)
+        self.assertIsInstance(self.data.mysql.session(), type(original.mysql.session))
+        self.assertEqual(self.data.mysql.session().expire_on_commit, original.mysql.session.expire_on_commit)
+        self.assertEqual(self.data.mysql.session().autoflush, original.mysql.session.autoflush)
+
+    def test_mysql_release(self):
+
+        area = self.sample.area("unit")
+
+        with self.app.app.app_context():
+
+            session = self.data.mysql.session()
+            session.query(nandy.store.mysql.Area).all()
+
+            checkedout = self.data.mysql.engine.pool.checkedout()
+
+        self.assertEqual(self.data.mysql.engine.pool.checkedout(), checkedout - 1)
+
+        # Rows loaded outside the request stay usable after it
+
+        self.assertIs(self.data.mysql.session(), session)
+        self.assertEqual(self.api.patch(f"/area/{area.area_id}", json={"area": {"status": "clean"}}).status_code, 202)
+        self.assertEqual(area.name, "unit")
+        self.assertEqual(area.status, "clean")
+
+    def test_mysql_stats(self):
+
+        stats = service.mysql_stats(self.data)
+
+        self.assertEqual(stats["size"], service.MYSQL_POOL_SIZE)
+        self.assertEqual(stats["overflow"], 0)
+        self.assertGreaterEqual(stats["waits"], 1)
+        self.assertGreaterEqual(stats["waited"], 0)
+        self.assertIn("checkedout", stats)
+
+    def test_profile_asked(self):
+
+        with self.app.app.test_request_context("/area", headers={"X-Profile": "secret"}):
+
+            self.assertFalse(service.profile_asked())
+
+            with unittest.mock.patch("service.PROFILE_TOKEN", "secret"):
+                self.assertTrue(service.profile_asked())
+
+            with unittest.mock.patch("service.PROFILE_TOKEN", "other"):
+                self.assertFalse(service.profile_asked())
+
+        with self.app.app.test_request_context("/area"), unittest.mock.patch("service.PROFILE_TOKEN", "secret"):
+            self.assertFalse(service.profile_asked())
+
+    @unittest.mock.patch("service.PROFILE_TOKEN", "secret")
+    def test_profile_start(self):
+
+        with self.app.app.test_request_context("/area"):
+            service.profile_start()
+            self.assertIsNone(getattr(flask.g, "sampler", None))
+
+        with self.app.app.test_request_context("/area", headers={"X-Profile": "1"}):
+            service.profile_start()
+            self.assertIsNone(getattr(flask.g, "sampler", None))
+
+        with self.app.app.test_request_context("/area", headers={"X-Profile": "secret"}):
+            service.profile_start()
+            self.assertIsNotNone(flask.g.sampler)
+            flask.g.sampler.stop()
+
+        with self.app.app.test_request_context("/area"), unittest.mock.patch("service.PROFILE_RATE", 1):
+            service.profile_start()
+            self.assertIsNotNone(flask.g.sampler)
+            flask.g.sampler.stop()
+
+    def test_profile_stop(self):
+
+        with tempfile.TemporaryDirectory() as directory, \
+             unittest.mock.patch("service.PROFILE_DIR", directory), \
+             unittest.mock.patch("service.PROFILE_TOKEN", "secret"), \
+             self.app.app.test_request_context("/area", headers={"X-Profile": "secret"}):
+
+            service.profile_start()
+            response = service.profile_stop("response")
+
+            self.assertEqual(response, "response")
+            self.assertIsNone(flask.g.sampler)
+            self.assertEqual(len(os.listdir(directory)), 1)
+            self.assertTrue(os.listdir(directory)[0].endswith(".collapsed"))
+
+    def test_timed(self):
+
+        @service.timed("unit")
+        def inner():
+            return "inner"
+
+        @service.timed("unit")
+        def outer():
+            time.sleep(0.01)
+            return inner()
+
+        self.assertEqual(outer(), "inner")
+
+        with self.app.app.test_request_context("/area"):
+
+            service.request_start()
+
+            self.assertEqual(outer(), "inner")
+            self.assertGreater(flask.g.timings["unit"], 0.01)
+            self.assertFalse(flask.g.timing)
+
     def test_model_in(self):
 
         self.assertEqual(service.model_in({
@@ -69,6 +250,28 @@ class TestService(unittest.TestCase):
             }
         })
 
+    def test_model_yaml(self):
+
+        service.YAML_CACHE.clear()
+        hits = service.YAML_CACHE.hits
+
+        area = self.sample.area(name="a", data={"d": 4})
+
+        self.assertEqual(service.model_yaml(area, {"d": 4}), yaml.dump({"d": 4}, default_flow_style=False))
+        self.assertEqual(service.model_yaml(area, {"d": 4}), yaml.dump({"d": 4}, default_flow_style=False))
+        self.assertEqual(service.model_yaml(area, {"d": 5}), yaml.dump({"d": 5}, default_flow_style=False))
+
+        self.assertEqual(service.YAML_CACHE.hits, hits + 1)
+        self.assertEqual(len(service.YAML_CACHE), 2)
+
+    def test_model_field(self):
+
+        self.assertTrue(service.model_field("a"))
+        self.assertTrue(service.model_field("a", fields=["a"]))
+        self.assertFalse(service.model_field("b", fields=["a"]))
+        self.assertTrue(service.model_field("a", exclude=["b"]))
+        self.assertFalse(service.model_field("b", exclude=["b"]))
+
     def test_model_out(self):
 
         area = self.sample.area(
@@ -89,6 +292,22 @@ class TestService(unittest.TestCase):
             "yaml": yaml.dump({"d": 4}, default_flow_style=False)
         })
 
+        self.assertEqual(service.model_out(area, fields=["name", "status"]), {
+            "name": "a",
+            "status": "b"
+        })
+
+        self.assertEqual(service.model_out(area, fields=["yaml"]), {
+            "yaml": yaml.dump({"d": 4}, default_flow_style=False)
+        })
+
+        self.assertEqual(service.model_out(area, exclude=["yaml", "data"]), {
+            "area_id": area.area_id,
+            "name": "a",
+            "status": "b",
+            "updated": 3
+        })
+
     def test_models_out(self):
 
         area = self.sample.area(
@@ -109,6 +328,380 @@ class TestService(unittest.TestCase):
             "yaml": yaml.dump({"d": 4}, default_flow_style=False)
         }])
 
+        self.assertEqual(service.models_out([area], fields=["name"]), [{
+            "name": "a"
+        }])
+
+    def test_model_tag(self):
+
+        area = self.sample.area(name="a", status="b", data={"d": 4})
+        tag = service.model_tag(area)
+
+        self.assertEqual(service.model_tag(area), tag)
+
+        area.status = "c"
+        self.assertNotEqual(service.model_tag(area), tag)
+
+    def test_models_tag(self):
+
+        area = self.sample.area(name="a", status="b", data={"d": 4})
+
+        with self.app.app.test_request_context("/area"):
+            tag = service.models_tag([area])
+            self.assertNotEqual(service.models_tag([]), tag)
+
+        with self.app.app.test_request_context("/area?fields=name"):
+            self.assertNotEqual(service.models_tag([area]), tag)
+
+        with self.app.app.test_request_context("/person"):
+            person = service.models_tag([])
+
+        with self.app.app.test_request_context("/area"):
+            self.assertNotEqual(service.models_tag([]), person)
+
+    def test_models_list_empty(self):
+
+        self.assertEqual(self.api.get("/person").json, {"persons": [], "next": None})
+        self.assertEqual(self.api.get("/area").json, {"areas": [], "next": None})
+        self.assertEqual(self.api.get("/chore?person=x").json, {"chores": [], "next": None})
+        self.assertEqual(self.api.get("/act?person=x").json, {"acts": [], "next": None})
+
+    def test_json_default(self):
+
+        self.assertEqual(service.json_default(datetime.datetime(2018, 1, 2, 3, 4, 5)), "2018-01-02T03:04:05")
+        self.assertEqual(service.json_default(datetime.date(2018, 1, 2)), "2018-01-02")
+        self.assertEqual(service.json_default(decimal.Decimal("1.5")), 1.5)
+        self.assertEqual(service.json_default(b"a"), "a")
+        self.assertRaisesRegex(TypeError, "object is not JSON serializable", service.json_default, object())
+
+    def test_json_encode(self):
+
+        for backend in ["json"] + (["orjson"] if service.orjson is not None else []):
+            with unittest.mock.patch("service.JSON_BACKEND", backend):
+                self.assertEqual(json.loads(service.json_encode({
+                    "a": 1,
+                    "b": decimal.Decimal("1.5")
+                })), {"a": 1, "b": 1.5})
+
+        with unittest.mock.patch("service.JSON_BACKEND", "orjson"), unittest.mock.patch("service.orjson", None):
+            self.assertEqual(json.loads(service.json_encode({"a": 1})), {"a": 1})
+
+    def test_JSONEncoder(self):
+
+        self.assertEqual(json.dumps({"a": decimal.Decimal("1.5")}, cls=service.JSONEncoder), '{"a": 1.5}')
+
+    def test_json_response(self):
+
+        with self.app.app.app_context():
+
+            response = service.json_response({"a": 1}, 201, {"ETag": '"b"'})
+
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.mimetype, "application/json")
+            self.assertEqual(response.headers["ETag"], '"b"')
+            self.assertEqual(json.loads(response.get_data()), {"a": 1})
+
+            self.assertEqual(service.json_response(b'{"a": 2}').get_data(), b'{"a": 2}')
+
+    def test_conditional(self):
+
+        service.RESPONSE_CACHE.clear()
+
+        with self.app.app.test_request_context("/area"):
+
+            response = service.conditional("a", lambda: {"b": 1}, 201)
+
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.headers["ETag"], '"a"')
+            self.assertEqual(json.loads(response.get_data()), {"b": 1})
+
+            response = service.conditional("a", lambda: self.fail("built"))
+            self.assertEqual(json.loads(response.get_data()), {"b": 1})
+
+        with self.app.app.test_request_context("/area", headers={"If-None-Match": '"a"'}):
+            response = service.conditional("a", lambda: self.fail("built"))
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers["ETag"], '"a"')
+
+    def test_models_filter(self):
+
+        self.sample.chore(person="unit", name="Unit", status="started", created=7, data={"node": "a"})
+        self.sample.chore(person="test", name="Test", status="ended", created=8, data={"node": "b"})
+
+        with self.app.app.app_context():
+
+            def names(**kwargs):
+                return [
+                    chore.name for chore in
+                    self.data.mysql.session.query(nandy.store.mysql.Chore).filter(
+                        *service.models_filter(nandy.store.mysql.Chore, **kwargs)
+                    ).order_by(nandy.store.mysql.Chore.chore_id).all()
+                ]
+
+            self.assertEqual(names(), ["Unit", "Test"])
+            self.assertEqual(names(person=["unit"]), ["Unit"])
+            self.assertEqual(names(node=["b"]), ["Test"])
+            self.assertEqual(names(status=["started", "ended"]), ["Unit", "Test"])
+            self.assertEqual(names(created=(8, None)), ["Test"])
+            self.assertEqual(names(created=(None, 8)), ["Unit"])
+            self.assertEqual(names(created=(None, None)), ["Unit", "Test"])
+
+    def test_models_filter_order(self):
+
+        self.sample.chore(person="unit", name="Unit", status="started", created=7, data={"node": "a"})
+        self.sample.chore(person="test", name="Test", status="ended", created=8, data={"node": "b"})
+        self.sample.chore(person="unit", name="Also", status="started", created=9, data={"node": "a"})
+
+        self.sample.act(person="unit", name="Unit", value="positive", created=7)
+        self.sample.act(person="test", name="Test", value="negative", created=8)
+        self.sample.act(person="unit", name="Also", value="positive", created=9)
+
+        def names(path, plural):
+
+            response = self.api.get(path)
+            self.assertEqual(response.status_code, 200, response.json)
+
+            return [model["name"] for model in response.json[plural]]
+
+        # Filtered or not, paged or not, newest first like the data layer
+
+        self.assertEqual(names("/chore", "chores"), ["Also", "Test", "Unit"])
+        self.assertEqual(names("/chore?person=unit", "chores"), ["Also", "Unit"])
+        self.assertEqual(names("/chore?node=a&status=started", "chores"), ["Also", "Unit"])
+        self.assertEqual(names("/chore?created_before=9", "chores"), ["Test", "Unit"])
+
+        response = self.api.get("/chore?person=unit&limit=1")
+        self.assertEqual([chore["name"] for chore in response.json["chores"]], ["Also"])
+        self.assertEqual(names(f"/chore?person=unit&limit=1&after={response.json['next']}", "chores"), ["Unit"])
+
+        self.assertEqual(names("/act", "acts"), ["Also", "Test", "Unit"])
+        self.assertEqual(names("/act?person=unit", "acts"), ["Also", "Unit"])
+        self.assertEqual(names("/act?value=positive&created_after=7", "acts"), ["Also", "Unit"])
+        self.assertEqual(names("/act?created_after=8&limit=5", "acts"), ["Also", "Test"])
+
+        response = self.api.get("/act?person=unit&limit=1")
+        self.assertEqual([act["name"] for act in response.json["acts"]], ["Also"])
+        self.assertEqual(names(f"/act?person=unit&limit=1&after={response.json['next']}", "acts"), ["Unit"])
+
+    def test_models_cursor(self):
+
+        unit = self.sample.act(person="unit", name="Unit", created=7)
+
+        cursor = service.models_cursor(nandy.store.mysql.Act, unit)
+
+        self.assertNotIn("=", cursor)
+        self.assertEqual(service.models_after(cursor), [7, unit.act_id])
+        self.assertRaises(ValueError, service.models_after, "nope")
+        self.assertRaises(ValueError, service.models_after, service.models_cursor(nandy.store.mysql.Act, unit)[:-2])
+
+    def test_models_page(self):
+
+        self.sample.area("unit")
+        self.sample.area("test")
+        self.sample.area("page")
+
+        with self.app.app.app_context():
+
+            models, cursor = service.models_page(nandy.store.mysql.Area)
+            self.assertEqual([model.name for model in models], ["page", "test", "unit"])
+            self.assertIsNone(cursor)
+
+            models, cursor = service.models_page(nandy.store.mysql.Area, limit=2)
+            self.assertEqual([model.name for model in models], ["page", "test"])
+            self.assertEqual(service.models_after(cursor)[0], "test")
+
+            models, cursor = service.models_page(nandy.store.mysql.Area, limit=2, after=service.models_after(cursor))
+            self.assertEqual([model.name for model in models], ["unit"])
+            self.assertIsNone(cursor)
+
+    def test_models_query(self):
+
+        unit = self.sample.act(person="unit", name="Unit", created=7)
+        self.sample.act(person="test", name="Test", created=8)
+        self.sample.act(person="same", name="Same", created=7)
+
+        with self.app.app.app_context():
+
+            # Newest first, ties on created broken by the primary key
+
+            self.assertEqual([act.name for act in service.models_query(nandy.store.mysql.Act)], ["Test", "Same", "Unit"])
+            self.assertEqual([act.name for act in service.models_query(nandy.store.mysql.Act, after=[8, 0])], ["Same", "Unit"])
+            self.assertEqual([act.name for act in service.models_query(nandy.store.mysql.Act, after=[7, unit.act_id + 1])], ["Unit"])
+            self.assertEqual([act.name for act in service.models_query(
+                nandy.store.mysql.Act, filters=[nandy.store.mysql.Act.name == "Unit"]
+            )], ["Unit"])
+
+    def test_models_streaming(self):
+
+        self.sample.area("unit")
+        self.sample.area("test")
+
+        with self.app.app.test_request_context("/area", headers={"Accept": "application/x-ndjson"}):
+            self.assertEqual(service.models_streaming(nandy.store.mysql.Area), "ndjson")
+
+        with self.app.app.test_request_context("/area"):
+
+            self.assertIsNone(service.models_streaming(nandy.store.mysql.Area))
+
+            with unittest.mock.patch("service.STREAM_ROWS", 1):
+                self.assertEqual(service.models_streaming(nandy.store.mysql.Area), "json")
+                self.assertIsNone(service.models_streaming(nandy.store.mysql.Area, limit=5))
+
+    def test_models_stream(self):
+
+        self.sample.area("unit")
+        self.sample.area("test")
+
+        with self.app.app.test_request_context("/area"):
+
+            response = service.models_stream(nandy.store.mysql.Area, "areas", "json", fields=["name"])
+
+            self.assertEqual(response.mimetype, "application/json")
+            self.assertEqual(json.loads(b"".join(response.response)), {
+                "areas": [{"name": "test"}, {"name": "unit"}],
+                "next": None
+            })
+
+        with self.app.app.test_request_context("/area"):
+
+            response = service.models_stream(nandy.store.mysql.Area, "areas", "json", fields=["name"], limit=1)
+            body = json.loads(b"".join(response.response))
+
+            self.assertEqual(body["areas"], [{"name": "test"}])
+            self.assertEqual(service.models_after(body["next"])[0], "test")
+
+            response = service.models_stream(
+                nandy.store.mysql.Area, "areas", "json", fields=["name"], limit=1, after=service.models_after(body["next"])
+            )
+
+            self.assertEqual(json.loads(b"".join(response.response)), {"areas": [{"name": "unit"}], "next": None})
+
+        with self.app.app.test_request_context("/area"):
+
+            response = service.models_stream(nandy.store.mysql.Area, "areas", "ndjson", fields=["name"], limit=1)
+
+            self.assertEqual(response.mimetype, "application/x-ndjson")
+            self.assertEqual(service.models_after(response.headers["X-Next"])[0], "test")
+            self.assertEqual(b"".join(response.response), b'{"name":"test"}\n' if service.JSON_BACKEND == "orjson" else b'{"name": "test"}\n')
+
+            response = service.models_stream(nandy.store.mysql.Area, "areas", "ndjson", fields=["name"], limit=2)
+
+            self.assertNotIn("X-Next", response.headers)
+            self.assertEqual(len(b"".join(response.response).splitlines()), 2)
+
+    def test_models_validate(self):
+
+        self.assertEqual(service.models_validate(nandy.store.mysql.Person, [
+            {"name": "unit"},
+            "nope",
+            {"name": "test", "bad": 1},
+            {"person_id": 1}
+        ]), [
+            {"index": 1, "error": "must be an object"},
+            {"index": 2, "error": "unknown fields ['bad']"},
+            {"index": 3, "error": "person_id can't be set"}
+        ])
+
+        self.assertEqual(service.models_validate(nandy.store.mysql.Person, [
+            {"person_id": 1, "name": "unit"},
+            {"name": "test"}
+        ], primary=True), [
+            {"index": 1, "error": "missing person_id"}
+        ])
+
+        self.assertEqual(service.models_validate(nandy.store.mysql.Person, [
+            {"person_id": 1}
+        ], primary=True), [
+            {"index": 0, "error": "nothing to update besides person_id"}
+        ])
+
+    @unittest.mock.patch("service.time.time")
+    def test_changed(self, mock_time):
+
+        mock_time.return_value = 7
+
+        with self.app.app.app_context(), unittest.mock.patch.object(self.data, "redis") as mock_redis:
+
+            service.changed("chore", 1, "next", 0)
+            mock_redis.publish.assert_not_called()
+
+            service.changed("chore", 1, "next")
+            mock_redis.publish.assert_called_once_with(service.EVENT_CHANNEL, json.dumps({
+                "kind": "chore",
+                "id": 1,
+                "action": "next",
+                "at": 7
+            }))
+
+            # What an action's side effects may have touched, as whole kinds
+
+            mock_redis.reset_mock()
+
+            service.affected("next", 0)
+            mock_redis.publish.assert_not_called()
+
+            service.affected("next")
+            self.assertEqual([json.loads(call[0][1]) for call in mock_redis.publish.call_args_list], [
+                {"kind": "chore", "id": None, "action": "next", "at": 7},
+                {"kind": "act", "id": None, "action": "next", "at": 7}
+            ])
+
+    def test_event_data(self):
+
+        self.assertEqual(service.event_data({"data": b"a"}), "a")
+        self.assertEqual(service.event_data({"data": "a"}), "a")
+
+    def test_event_stream(self):
+
+        with unittest.mock.patch.object(self.data, "redis") as mock_redis:
+
+            pubsub = mock_redis.pubsub.return_value
+            pubsub.get_message.side_effect = [{"data": b'{"id": 1}'}, {"data": '{"id": 2}'}, None]
+
+            response = self.api.get("/event?timeout=1")
+
+            self.assertEqual(response.status_code, 200, response.json)
+            self.assertEqual(response.json, {"events": [{"id": 1}, {"id": 2}]})
+            pubsub.subscribe.assert_called_once_with(service.EVENT_CHANNEL)
+            pubsub.close.assert_called_once_with()
+
+            pubsub.reset_mock()
+            pubsub.get_message.side_effect = [{"data": b'{"id": 3}'}] + [None] * 10
+
+            response = self.api.get("/event?timeout=1", headers={"Accept": "text/event-stream"})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, "text/event-stream")
+            self.assertIn('data: {"id": 3}\n\n', response.get_data(as_text=True))
+
+    def test_event_stream_limit(self):
+
+        with unittest.mock.patch("service.EVENT_SLOTS", threading.BoundedSemaphore(1)) as slots, \
+             unittest.mock.patch.object(self.data, "redis") as mock_redis:
+
+            mock_redis.pubsub.return_value.get_message.return_value = None
+
+            self.assertTrue(slots.acquire(blocking=False))
+
+            response = self.api.get("/event?timeout=0")
+
+            self.assertEqual(response.status_code, 503, response.json)
+            self.assertEqual(response.headers["Retry-After"], "1")
+            mock_redis.pubsub.assert_not_called()
+
+            slots.release()
+
+            self.assertEqual(self.api.get("/event?timeout=0").status_code, 200)
+
+            response = self.api.get("/event?timeout=0", headers={"Accept": "text/event-stream"})
+            self.assertEqual(response.status_code, 200)
+            response.close()
+
+            # Both connections gave their slot back
+
+            self.assertTrue(slots.acquire(blocking=False))
+            slots.release()
+
     def test_setting_load(self):
 
         self.assertEqual(service.setting_load(), {
@@ -121,9 +714,127 @@ class TestService(unittest.TestCase):
             ]
         })
 
+    def test_setting_load_changed(self):
+
+        with unittest.mock.patch("service.os.stat") as mock_stat, \
+             unittest.mock.patch("service.open", unittest.mock.mock_open(read_data="a: 1"), create=True) as mock_open:
+
+            service.SETTINGS = None
+
+            mock_stat.return_value = unittest.mock.MagicMock(st_ino=1, st_mtime=2, st_size=3)
+            self.assertEqual(service.setting_load(), {"a": 1})
+            self.assertEqual(service.setting_load(), {"a": 1})
+            self.assertEqual(mock_open.call_count, 1)
+
+            mock_stat.return_value = unittest.mock.MagicMock(st_ino=4, st_mtime=2, st_size=3)
+            self.assertEqual(service.setting_load(), {"a": 1})
+            self.assertEqual(mock_open.call_count, 2)
+
+        service.SETTINGS = None
+
     def test_health(self):
 
-        self.assertEqual(self.api.get("/health").json, {"message": "OK"})
+        self.assertEqual(self.api.get("/health").json, {
+            "message": "OK",
+            "yaml": service.YAML_BACKEND,
+            "json": service.JSON_BACKEND
+        })
+
+    def test_health_live(self):
+
+        self.assertEqual(self.api.get("/health/live").json, {"message": "OK"})
+
+    def test_health_probe(self):
+
+        self.assertEqual(service.health_probe("unit", lambda data: None, None)["ok"], True)
+
+        def fail(data):
+            raise Exception("nope")
+
+        self.assertEqual(service.health_probe("test", fail, None), {"ok": False, "error": "nope"})
+
+        event = threading.Event()
+
+        with unittest.mock.patch("service.HEALTH_TIMEOUT", 0.01):
+            self.assertEqual(service.health_probe("slow", lambda data: event.wait(), None), {
+                "ok": False,
+                "error": "timed out after 0.01s"
+            })
+            running = service.HEALTH_RUNNING["slow"]
+            service.health_probe("slow", lambda data: None, None)
+            self.assertIs(service.HEALTH_RUNNING["slow"], running)
+
+        event.set()
+
+    @unittest.mock.patch.dict(os.environ, {"GRAPHITE_HOST": "graphite"})
+    @unittest.mock.patch("service.health_graphite")
+    @unittest.mock.patch("service.health_redis")
+    @unittest.mock.patch("service.health_mysql")
+    def test_health_ready(self, mock_mysql, mock_redis, mock_graphite):
+
+        service.HEALTH = None
+
+        response = self.api.get("/health/ready")
+
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertTrue(response.json["ready"])
+        self.assertEqual(sorted(response.json["dependencies"].keys()), ["graphite", "mysql", "redis"])
+
+        mock_redis.side_effect = Exception("down")
+
+        self.assertEqual(self.api.get("/health/ready").status_code, 200)
+
+        service.HEALTH = None
+
+        response = self.api.get("/health/ready")
+
+        self.assertEqual(response.status_code, 503, response.json)
+        self.assertEqual(response.json["dependencies"]["redis"], {"ok": False, "error": "down"})
+
+        service.HEALTH = None
+
+        mock_redis.side_effect = None
+        mock_graphite.side_effect = Exception("down")
+
+        response = self.api.get("/health/ready")
+
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertEqual(response.json["dependencies"]["graphite"], {"ok": False, "error": "down"})
+
+        service.HEALTH = None
+        mock_graphite.reset_mock()
+
+        with unittest.mock.patch.dict(os.environ):
+
+            os.environ.pop("GRAPHITE_HOST", None)
+
+            response = self.api.get("/health/ready")
+
+            self.assertEqual(response.status_code, 200, response.json)
+            self.assertNotIn("graphite", response.json["dependencies"])
+            mock_graphite.assert_not_called()
+
+        service.HEALTH = None
+
+    @unittest.mock.patch("service.socket.create_connection")
+    def test_health_graphite(self, mock_connection):
+
+        with unittest.mock.patch.dict(os.environ, {"GRAPHITE_HOST": "unit"}):
+            os.environ.pop("GRAPHITE_PORT", None)
+            service.health_graphite(None)
+
+        mock_connection.assert_called_once_with(("unit", 2003), timeout=service.HEALTH_TIMEOUT)
+
+    def test_cache_list(self):
+
+        service.YAML_CACHE.clear()
+
+        response = self.api.get("/cache")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["caches"]["yaml"]["size"], 0)
+        self.assertEqual(response.json["caches"]["yaml"]["max"], service.YAML_CACHE.size)
+        self.assertEqual(sorted(response.json["caches"].keys()), ["compress", "local", "response", "retrieve", "yaml"])
 
     def test_setting_list(self):
 
@@ -156,6 +867,68 @@ class TestService(unittest.TestCase):
             "email": "test",
         })
 
+        self.assertEqual(self.api.post("/person", json={"person": {"email": "test"}}).status_code, 400)
+        self.assertEqual(self.api.post("/person", json={"person": {"name": "unit", "nope": "bad"}}).status_code, 400)
+        self.assertEqual(self.api.post("/person", json={"person": {"name": 1}}).status_code, 400)
+
+    def test_person_bulk_create(self):
+
+        # Each goes through the data layer, like a single create
+
+        with unittest.mock.patch.object(self.data, "person_create", wraps=self.data.person_create) as person_create:
+
+            response = self.api.post("/person/bulk", json={
+                "persons": [
+                    {
+                        "name": "unit",
+                        "email": "test"
+                    },
+                    {
+                        "name": "test",
+                        "email": "unit"
+                    }
+                ]
+            })
+
+            self.assertEqual(person_create.call_count, 2)
+
+        self.assertStatusModels(response, 201, "persons", [
+            {
+                "name": "unit",
+                "email": "test"
+            },
+            {
+                "name": "test",
+                "email": "unit"
+            }
+        ])
+
+        response = self.api.post("/person/bulk", json={
+            "persons": [
+                {
+                    "name": "more"
+                },
+                {
+                    "nope": "bad"
+                }
+            ]
+        })
+
+        self.assertEqual(response.status_code, 400)
+
+        self.assertStatusValue(self.api.post("/person/bulk", json={
+            "persons": [
+                {
+                    "person_id": 1,
+                    "name": "more"
+                }
+            ]
+        }), 400, "errors", [
+            {"index": 0, "error": "person_id can't be set"}
+        ])
+
+        self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Person).all()), 2)
+
     def test_person_list(self):
 
         self.sample.person("unit")
@@ -192,6 +965,16 @@ class TestService(unittest.TestCase):
         queried = self.data.mysql.session.query(nandy.store.mysql.Person).one()
         self.assertEqual(queried.email, "testy")
 
+    def test_person_update_changed(self):
+
+        sample = self.sample.person("unit", "test")
+
+        with unittest.mock.patch("service.changed") as mock_changed:
+
+            self.api.patch(f"/person/{sample.person_id}", json={"person": {"email": "testy"}})
+
+            mock_changed.assert_called_once_with("person", sample.person_id, "update", 1)
+
     def test_person_delete(self):
 
         sample = self.sample.person("unit", "test")
@@ -224,7 +1007,9 @@ class TestService(unittest.TestCase):
         self.sample.area("unit")
         self.sample.area("test")
 
-        self.assertStatusModels(self.api.get("/area"), 200, "areas", [
+        response = self.api.get("/area")
+
+        self.assertStatusModels(response, 200, "areas", [
             {
                 "name": "test"
             },
@@ -232,12 +1017,30 @@ class TestService(unittest.TestCase):
                 "name": "unit"
             }
         ])
+
+        self.assertEqual(self.api.get("/area", headers={"If-None-Match": response.headers["ETag"]}).status_code, 304)
+
+        with unittest.mock.patch.object(self.app.app.compress, "minimum", 0):
+
+            response = self.api.get("/area", headers={"Accept-Encoding": "gzip"})
+
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(json.loads(gzip.decompress(response.get_data()))["areas"][0]["name"], "test")
+            self.assertTrue(response.headers["ETag"].startswith("W/"))
+
+            self.assertEqual(self.api.get("/area", headers={"If-None-Match": response.headers["ETag"]}).status_code, 304)
+
+        self.sample.area("more")
+
+        self.assertEqual(self.api.get("/area", headers={"If-None-Match": response.headers["ETag"]}).status_code, 200)
         
     def test_area_retrieve(self):
 
         sample = self.sample.area(name="unit", status="test", updated=7, data={"a": 1})
 
-        self.assertStatusModel(self.api.get(f"/area/{sample.area_id}"), 200, "area", {
+        response = self.api.get(f"/area/{sample.area_id}")
+
+        self.assertStatusModel(response, 200, "area", {
             "name": "unit",
             "status": "test",
             "updated": 7,
@@ -245,6 +1048,138 @@ class TestService(unittest.TestCase):
             "yaml": yaml.dump({"a": 1}, default_flow_style=False)
         })
 
+        self.assertEqual(self.api.get(f"/area/{sample.area_id}", headers={
+            "If-None-Match": response.headers["ETag"]
+        }).status_code, 304)
+
+    def test_retrieved(self):
+
+        sample = self.sample.area(name="unit", status="test", updated=7, data={"a": 1})
+
+        client = unittest.mock.MagicMock()
+        client.get.return_value = None
+        client.mget.return_value = [None, None]
+        client.set.return_value = True
+
+        with unittest.mock.patch.object(self.app.app, "retrieve", cache.Redis(client, "nandy-api/retrieve", ttl=5)):
+
+            response = self.api.get(f"/area/{sample.area_id}")
+            self.assertStatusModel(response, 200, "area", {"name": "unit"})
+
+            client.mget.assert_any_call([
+                "nandy-api/retrieve/area/version",
+                f"nandy-api/retrieve/area/{sample.area_id}/version"
+            ])
+
+            key, value = client.set.call_args_list[-1][0]
+            self.assertEqual(key, f"nandy-api/retrieve/area/{sample.area_id}/0.0")
+            self.assertEqual(value[:40].decode(), response.headers["ETag"].strip('"'))
+            self.assertEqual(json.loads(value[40:]), response.json)
+            self.assertEqual(client.eval.call_args[0][2], f"nandy-api/retrieve/area/{sample.area_id}/0.0/lock")
+
+            # A hit never asks MySQL
+
+            client.get.return_value = b"1" * 40 + b'{"area": {"name": "cached"}}'
+
+            with unittest.mock.patch.object(self.data, "area_retrieve") as mock_retrieve:
+                response = self.api.get(f"/area/{sample.area_id}")
+                mock_retrieve.assert_not_called()
+
+            self.assertStatusModel(response, 200, "area", {"name": "cached"})
+            self.assertEqual(response.headers["ETag"], f'"{"1" * 40}"')
+
+            # Writes move the row on to a new version
+
+            client.set.reset_mock()
+
+            self.api.patch(f"/area/{sample.area_id}", json={"area": {"status": "testy"}})
+            self.assertEqual([call[0][0] for call in client.set.call_args_list], [f"nandy-api/retrieve/area/{sample.area_id}/version"])
+            self.assertEqual(client.set.call_args[1], {"ex": 10})
+
+            # Actions move on every chore and act too, as the data layer may
+            # have written some as well as the area
+
+            client.set.reset_mock()
+
+            with unittest.mock.patch.object(self.data, "area_status", return_value=1):
+                self.api.post(f"/area/{sample.area_id}/test")
+            self.assertEqual([call[0][0] for call in client.set.call_args_list], [
+                f"nandy-api/retrieve/area/{sample.area_id}/version",
+                "nandy-api/retrieve/chore/version",
+                "nandy-api/retrieve/act/version"
+            ])
+
+    @unittest.mock.patch("service.LOCAL_TTL", 5)
+    def test_local(self):
+
+        sample = self.sample.area(name="unit", status="test")
+
+        with unittest.mock.patch.object(self.app.app, "local", cache.LRU(10, ttl=5)):
+
+            response = self.api.get(f"/area/{sample.area_id}")
+            listed = self.api.get("/area")
+
+            with unittest.mock.patch.object(self.data, "area_retrieve") as mock_retrieve, \
+                 unittest.mock.patch("service.models_page") as mock_page:
+
+                self.assertEqual(self.api.get(f"/area/{sample.area_id}").json, response.json)
+                self.assertEqual(self.api.get("/area").json, listed.json)
+
+                mock_retrieve.assert_not_called()
+                mock_page.assert_not_called()
+
+            self.api.patch(f"/area/{sample.area_id}", json={"area": {"status": "testy"}})
+
+            self.assertEqual(self.api.get(f"/area/{sample.area_id}").json["area"]["status"], "testy")
+            self.assertEqual(self.api.get("/area").json["areas"][0]["status"], "testy")
+
+    def test_local_invalidate(self):
+
+        with unittest.mock.patch.object(self.app.app, "local", cache.LRU(10)):
+
+            self.app.app.local.set(("area", "1"), b"a")
+            generation = self.app.app.generations["area"]
+
+            service.local_invalidate(self.app.app, "area", 1)
+
+            self.assertIsNone(self.app.app.local.get(("area", "1")))
+            self.assertEqual(self.app.app.generations["area"], generation + 1)
+
+            # Every row of a kind at once
+
+            self.app.app.local.set(("act", "1"), b"a")
+            self.app.app.local.set(("act", "2"), b"b")
+            self.app.app.local.set(("area", "1"), b"c")
+
+            service.local_invalidate(self.app.app, "act", None)
+
+            self.assertIsNone(self.app.app.local.get(("act", "1")))
+            self.assertIsNone(self.app.app.local.get(("act", "2")))
+            self.assertEqual(self.app.app.local.get(("area", "1")), b"c")
+
+    @unittest.mock.patch("service.time.sleep")
+    def test_local_listen(self, mock_sleep):
+
+        mock_sleep.side_effect = SystemExit
+
+        with unittest.mock.patch.object(self.app.app, "local", cache.LRU(10)), \
+             unittest.mock.patch.object(self.data, "redis") as mock_redis:
+
+            self.app.app.local.set(("area", "1"), b"a")
+            self.app.app.local.set(("area", "2"), b"b")
+
+            def listen():
+                self.app.app.local.set(("area", "1"), b"a")
+                yield {"data": json.dumps({"kind": "area", "id": 1, "action": "update"}).encode()}
+                raise Exception("gone")
+
+            mock_redis.pubsub.return_value.listen.side_effect = listen
+
+            self.assertRaises(SystemExit, service.local_listen, self.app.app)
+
+            mock_redis.pubsub.return_value.subscribe.assert_called_once_with(service.EVENT_CHANNEL)
+            self.assertEqual(len(self.app.app.local), 0)
+
     def test_area_update(self):
 
         sample = self.sample.area(name="unit", status="test")
@@ -375,6 +1310,71 @@ class TestService(unittest.TestCase):
         queried = self.data.mysql.session.query(nandy.store.mysql.Template).one()
         self.assertEqual(queried.kind, "act")
 
+    def test_template_bulk_update(self):
+
+        unit = self.sample.template(name="unit", kind="chore")
+        test = self.sample.template(name="test", kind="chore")
+
+        with unittest.mock.patch.object(self.data, "template_update", wraps=self.data.template_update) as template_update:
+
+            self.assertStatusValue(self.api.patch("/template/bulk", json={
+                "templates": [
+                    {
+                        "template_id": unit.template_id,
+                        "kind": "act"
+                    },
+                    {
+                        "template_id": test.template_id,
+                        "yaml": yaml.dump({"a": 1})
+                    },
+                    {
+                        "template_id": 0,
+                        "kind": "act"
+                    }
+                ]
+            }), 202, "templates", [
+                {"template_id": unit.template_id, "updated": 1},
+                {"template_id": test.template_id, "updated": 1},
+                {"template_id": 0, "updated": 0}
+            ])
+
+            self.assertEqual(template_update.call_count, 3)
+
+        # Only the key is a 400, not an empty update
+
+        self.assertStatusValue(self.api.patch("/template/bulk", json={
+            "templates": [
+                {
+                    "template_id": unit.template_id,
+                    "kind": "chore"
+                },
+                {
+                    "template_id": test.template_id
+                }
+            ]
+        }), 400, "errors", [
+            {"index": 1, "error": "nothing to update besides template_id"}
+        ])
+
+        # A failure part way keeps none of them, however the data layer commits
+
+        update = self.data.template_update
+
+        def fail(template_id, fields):
+            if template_id == test.template_id:
+                raise Exception("nope")
+            return update(template_id, fields)
+
+        with unittest.mock.patch.object(self.data, "template_update", side_effect=fail):
+            self.assertEqual(self.api.patch("/template/bulk", json={"templates": [
+                {"template_id": unit.template_id, "kind": "chore"},
+                {"template_id": test.template_id, "kind": "chore"}
+            ]}).status_code, 500)
+
+        self.data.mysql.session.expire_all()
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Template).get(unit.template_id).kind, "act")
+        self.assertEqual(self.data.mysql.session.query(nandy.store.mysql.Template).get(test.template_id).data, {"a": 1})
+
     def test_template_delete(self):
 
         sample = self.sample.template(name="unit", kind="chore")
@@ -498,6 +1498,23 @@ class TestService(unittest.TestCase):
             }
         ])
 
+        self.assertStatusModels(self.api.get("/chore?person=unit&created_before=8"), 200, "chores", [
+            {
+                "name": "Unit"
+            }
+        ])
+
+        response = self.api.get("/chore?fields=chore_id,name,status")
+
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertEqual(sorted(response.json["chores"][0].keys()), ["chore_id", "name", "status"])
+
+        response = self.api.get("/chore?exclude=yaml")
+
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertNotIn("yaml", response.json["chores"][0])
+        self.assertIn("data", response.json["chores"][0])
+
     def test_chore_retrieve(self):
 
         sample = self.sample.chore(person="unit", name="Unit", data={
@@ -530,6 +1547,9 @@ class TestService(unittest.TestCase):
         queried = self.data.mysql.session.query(nandy.store.mysql.Chore).one()
         self.assertEqual(queried.name, "Unit")
 
+        self.assertEqual(self.api.patch(f"/chore/{sample.chore_id}", json={"chore": {"status": 1}}).status_code, 400)
+        self.assertEqual(self.api.patch(f"/chore/{sample.chore_id}", json={"nope": {}}).status_code, 400)
+
     @unittest.mock.patch("nandy.data.time.time")
     def test_chore_action(self, mock_time):
 
@@ -732,6 +1752,23 @@ class TestService(unittest.TestCase):
 
         self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Chore).all()), 0)
 
+    def test_chore_bulk_delete(self):
+
+        unit = self.sample.chore(person="kid", name="Unit")
+        test = self.sample.chore(person="kid", name="Test")
+
+        with unittest.mock.patch.object(self.data, "chore_delete", wraps=self.data.chore_delete) as chore_delete:
+
+            self.assertStatusValue(self.api.delete(f"/chore/bulk?chore_ids={unit.chore_id},{test.chore_id},0"), 202, "chores", [
+                {"chore_id": unit.chore_id, "deleted": 1},
+                {"chore_id": test.chore_id, "deleted": 1},
+                {"chore_id": 0, "deleted": 0}
+            ])
+
+            self.assertEqual(chore_delete.call_count, 3)
+
+        self.assertEqual(len(self.data.mysql.session.query(nandy.store.mysql.Chore).all()), 0)
+
     # Task
 
     @unittest.mock.patch("nandy.data.time.time")
@@ -863,6 +1900,140 @@ class TestService(unittest.TestCase):
         })
         self.assertStatusValue(self.api.post(f"/chore/{chore.chore_id}/task/0/incomplete"), 202, "updated", 0)
 
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_chore_action_conflict(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = self.sample.chore(person="kid", data={"start": 1}, tasks=[{"text": "do it", "start": 1}])
+
+        self.assertEqual(self.api.post("/chore/0/pause").status_code, 404)
+
+        tag = service.model_tag(self.data.mysql.session.query(nandy.store.mysql.Chore).one())
+
+        response = self.api.post(f"/chore/{chore.chore_id}/pause", headers={"If-Match": f'"{tag}"'})
+        self.assertStatusValue(response, 202, "updated", 1)
+        self.assertNotEqual(response.headers["X-Chore-ETag"], f'"{tag}"')
+
+        self.assertEqual(self.api.post(f"/chore/{chore.chore_id}/unpause", headers={"If-Match": f'"{tag}"'}).status_code, 409)
+        self.assertTrue(self.data.mysql.session.query(nandy.store.mysql.Chore).one().data["paused"])
+
+        self.assertStatusValue(self.api.post(
+            f"/chore/{chore.chore_id}/unpause", headers={"If-Match": response.headers["X-Chore-ETag"]}
+        ), 202, "updated", 1)
+
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_task_action_conflict(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = self.sample.chore(person="kid", data={"start": 1}, tasks=[{"text": "do it", "start": 1}])
+
+        self.assertEqual(self.api.post(f"/chore/{chore.chore_id}/task/1/pause").status_code, 404)
+        self.assertEqual(self.api.post("/chore/0/task/0/pause").status_code, 404)
+
+        tag = service.model_tag(self.data.mysql.session.query(nandy.store.mysql.Chore).one())
+
+        response = self.api.post(f"/chore/{chore.chore_id}/task/0/pause", headers={"If-Match": f'"{tag}"'})
+        self.assertStatusValue(response, 202, "updated", 1)
+        self.assertNotEqual(response.headers["X-Chore-ETag"], f'"{tag}"')
+        self.assertNotIn("ETag", response.headers)
+
+        response = self.api.post(f"/chore/{chore.chore_id}/task/0/unpause", headers={"If-Match": f'"{tag}"'})
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn("ETag", response.headers)
+        self.assertTrue(self.data.mysql.session.query(nandy.store.mysql.Chore).one().data["tasks"][0]["paused"])
+
+        self.assertStatusValue(self.api.post(
+            f"/chore/{chore.chore_id}/task/0/unpause", headers={"If-Match": response.headers["X-Chore-ETag"]}
+        ), 202, "updated", 1)
+
+    @unittest.mock.patch("nandy.data.time.time")
+    def test_chore_actions(self, mock_time):
+
+        mock_time.return_value = 7
+
+        chore = self.sample.chore(person="kid", data={"start": 1}, tasks=[{"text": "do it", "start": 1}])
+
+        response = self.api.post(f"/chore/{chore.chore_id}/actions", json={"actions": [
+            {"action": "pause", "task_id": 0},
+            {"action": "unpause", "task_id": 0},
+            {"action": "pause", "task_id": 0},
+            {"action": "pause", "task_id": 0}
+        ]})
+
+        self.assertStatusValue(response, 202, "updated", [1, 1, 1, 0])
+        self.assertTrue(response.json["chore"]["data"]["tasks"][0]["paused"])
+        self.assertTrue(self.data.mysql.session.query(nandy.store.mysql.Chore).one().data["tasks"][0]["paused"])
+        self.assertEqual(response.headers["X-Chore-ETag"], f'"{service.model_tag(self.data.mysql.session.query(nandy.store.mysql.Chore).one())}"')
+        self.assertNotIn("ETag", response.headers)
+
+        self.assertStatusValue(self.api.post(f"/chore/{chore.chore_id}/actions", json={"actions": [
+            {"action": "unpause", "task_id": 0}
+        ]}, headers={"If-Match": response.headers["X-Chore-ETag"]}), 202, "updated", [1])
+
+        # Compressed, the chore itself isn't confused with what acting on it returned
+
+        with unittest.mock.patch.object(self.app.app.compress, "minimum", 0):
+
+            response = self.api.post(f"/chore/{chore.chore_id}/actions", json={"actions": [
+                {"action": "pause", "task_id": 0}
+            ]}, headers={"Accept-Encoding": "gzip"})
+
+            self.assertEqual(response.status_code, 202)
+
+            response = self.api.get(f"/chore/{chore.chore_id}", headers={"Accept-Encoding": "gzip"})
+
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(json.loads(gzip.decompress(response.get_data()))["chore"]["chore_id"], chore.chore_id)
+
+        # Nothing's applied unless it's all valid
+
+        self.assertStatusValue(self.api.post(f"/chore/{chore.chore_id}/actions", json={"actions": [
+            {"action": "unpause", "task_id": 0},
+            {"action": "unpause", "task_id": 1},
+            {"action": "next", "task_id": 0}
+        ]}), 400, "errors", [
+            {"index": 1, "error": "task 1 not found"},
+            {"index": 2, "error": "unknown task action next"}
+        ])
+
+        self.assertEqual(self.api.post(f"/chore/{chore.chore_id}/actions", json={"actions": [{"action": "nope"}]}).status_code, 400)
+        self.assertEqual(self.api.post("/chore/0/actions", json={"actions": [{"action": "next"}]}).status_code, 404)
+        self.assertEqual(self.api.post(f"/chore/{chore.chore_id}/actions", json={"actions": [{"action": "next"}]}, headers={
+            "If-Match": '"nope"'
+        }).status_code, 409)
+
+        # Or if any action fails, however often the ones before it committed
+
+        unpause = self.data.task_unpause
+
+        def twice(task, chore):
+            updated = unpause(task, chore)
+            self.data.mysql.session.commit()
+            self.data.mysql.session.commit()
+            return updated
+
+        with unittest.mock.patch.object(self.data, "task_unpause", side_effect=twice), \
+             unittest.mock.patch.object(self.data, "task_skip", side_effect=Exception("nope")):
+            self.assertEqual(self.api.post(f"/chore/{chore.chore_id}/actions", json={"actions": [
+                {"action": "unpause", "task_id": 0},
+                {"action": "skip", "task_id": 0}
+            ]}).status_code, 500)
+
+        self.data.mysql.session.remove()
+        self.assertTrue(self.data.mysql.session.query(nandy.store.mysql.Chore).one().data["tasks"][0]["paused"])
+
+        # Commits are real again afterwards
+
+        self.assertStatusValue(self.api.post(f"/chore/{chore.chore_id}/actions", json={"actions": [
+            {"action": "unpause", "task_id": 0}
+        ]}), 202, "updated", [1])
+
+        self.data.mysql.session.remove()
+        self.assertNotIn("commit", vars(self.data.mysql.session()))
+        self.assertFalse(self.data.mysql.session.query(nandy.store.mysql.Chore).one().data["tasks"][0].get("paused"))
+
     # Act
 
     @unittest.mock.patch("nandy.data.time.time")
@@ -942,6 +2113,49 @@ class TestService(unittest.TestCase):
             }
         ])
 
+        self.assertStatusModels(self.api.get("/act?person=test&created_after=8"), 200, "acts", [
+            {
+                "name": "Test"
+            }
+        ])
+
+        # Paged, streamed or whole, newest first like the data layer lists them
+
+        response = self.api.get("/act?limit=1")
+        self.assertStatusModels(response, 200, "acts", [
+            {
+                "name": "Test"
+            }
+        ])
+
+        self.assertStatusModels(self.api.get(f"/act?limit=1&after={response.json['next']}"), 200, "acts", [
+            {
+                "name": "Unit"
+            }
+        ])
+        self.assertIsNone(self.api.get(f"/act?limit=1&after={response.json['next']}").json["next"])
+        self.assertEqual(self.api.get("/act?limit=1&after=nope").status_code, 400)
+
+        response = self.api.get("/act?fields=name", headers={"Accept": "application/x-ndjson"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([json.loads(line) for line in response.get_data().splitlines()], [{"name": "Test"}, {"name": "Unit"}])
+
+        response = self.api.get("/act?fields=name&limit=1", headers={"Accept": "application/x-ndjson"})
+
+        self.assertEqual([json.loads(line) for line in response.get_data().splitlines()], [{"name": "Test"}])
+
+        response = self.api.get(f"/act?fields=name&limit=1&after={response.headers['X-Next']}", headers={"Accept": "application/x-ndjson"})
+
+        self.assertEqual([json.loads(line) for line in response.get_data().splitlines()], [{"name": "Unit"}])
+        self.assertNotIn("X-Next", response.headers)
+
+        with unittest.mock.patch("service.STREAM_ROWS", 1):
+            self.assertEqual(self.api.get("/act?fields=name").json, {
+                "acts": [{"name": "Test"}, {"name": "Unit"}],
+                "next": None
+            })
+
     def test_act_retrieve(self):
 
         sample = self.sample.act(person="kid", name='Unit', value="positive", created=7, data={"a": 1})
@@ -0,0 +1,67 @@
+import unittest
+import unittest.mock
+
+import os
+import json
+import tempfile
+
+import spec
+
+class TestSpec(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+
+        with open(os.path.join(self.directory.name, "service.yaml"), "w") as source_file:
+            source_file.write("a: [1, b]\n")
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+
+    def test_digest(self):
+
+        self.assertEqual(spec.digest(b"a"), "ca978112ca1bbdcafac231b39a23dc4da786eff8147c4e72b9807785afee48bb")
+
+    def test_paths(self):
+
+        self.assertEqual(spec.paths("/opt", "service"), ("/opt/service.yaml", "/opt/service.json"))
+
+    def test_parse(self):
+
+        self.assertEqual(spec.parse("a: [1, b]"), {"a": [1, "b"]})
+
+    def test_compile(self):
+
+        compiled = spec.compile(self.directory.name)
+
+        self.assertEqual(compiled, os.path.join(self.directory.name, "service.json"))
+
+        with open(compiled, "r") as compiled_file:
+            self.assertEqual(json.load(compiled_file), {
+                "sha256": spec.digest(b"a: [1, b]\n"),
+                "spec": {"a": [1, "b"]}
+            })
+
+    @unittest.mock.patch("spec.parse")
+    def test_load(self, mock_parse):
+
+        mock_parse.return_value = "parsed"
+
+        self.assertEqual(spec.load(self.directory.name), "parsed")
+
+        with open(os.path.join(self.directory.name, "service.json"), "w") as compiled_file:
+            json.dump({"sha256": spec.digest(b"a: [1, b]\n"), "spec": "compiled"}, compiled_file)
+
+        self.assertEqual(spec.load(self.directory.name), "compiled")
+
+        with open(os.path.join(self.directory.name, "service.yaml"), "w") as source_file:
+            source_file.write("a: [2, b]\n")
+
+        self.assertEqual(spec.load(self.directory.name), "parsed")
+
+        with open(os.path.join(self.directory.name, "service.json"), "w") as compiled_file:
+            compiled_file.write("nope")
+
+        self.assertEqual(spec.load(self.directory.name), "parsed")